@@ -0,0 +1,63 @@
+"""
+Measures the cold start of the app: the time it takes to import main.py,
+i.e. everything that runs before the login prompt appears.
+
+Each run starts a fresh interpreter with `-X importtime` from a temporary
+working directory (main.py opens audit.log there). The median wall time over
+all runs is reported, followed by the modules with the largest cumulative
+import time in the median run.
+
+    python -m benchmarks.bench_import --repeat 10 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_once(module="main"):
+    """
+    Imports module in a new interpreter. Returns the wall time in seconds and
+    {module name: (self us, cumulative us)} parsed from the -X importtime output.
+    """
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR)
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=directory, env=env, capture_output=True, text=True, check=True
+        )
+        wall_time = time.perf_counter() - start
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return wall_time, modules
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the import time of the Breeze app.")
+    parser.add_argument("--repeat", type=int, default=10, help="number of cold starts")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest modules to list")
+    parser.add_argument("--module", default="main", help="module to import")
+    args = parser.parse_args()
+
+    runs = sorted((import_once(args.module) for _ in range(args.repeat)), key=lambda run: run[0])
+    wall_times = [run[0] for run in runs]
+    median_time, median_modules = runs[len(runs) // 2]
+    print(f"import {args.module}: median {statistics.median(wall_times) * 1000:.1f} ms, "
+          f"min {wall_times[0] * 1000:.1f} ms, max {wall_times[-1] * 1000:.1f} ms over {len(runs)} runs")
+    print(f"{len(median_modules)} modules imported\n")
+    print(f"{'module':<40}{'self ms':>10}{'cumulative ms':>16}")
+    slowest = sorted(median_modules.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"{name:<40}{self_us / 1000:>10.2f}{cumulative_us / 1000:>16.2f}")
@@ -0,0 +1,153 @@
+"""
+Times the data handler functions and the main controller queries on
+generated data sets (see benchmarks/generate_data.py).
+
+Each size is generated into a temporary directory, which becomes the working
+directory while it is measured, so the real data/ directory is never touched.
+For every operation the throughput and the 50th/95th/99th percentile
+latencies are reported.
+
+    python -m benchmarks.bench_storage --sizes 1000,100000 --repeat 20
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import tempfile
+import time
+from unittest import mock
+from benchmarks.generate_data import generate
+from controllers.admin import AdminController
+from controllers.mhwp import MHWPController
+from controllers.patient import PatientController
+from models.user import Admin, MHWP, Patient
+from utils.data_handler import *
+
+
+APPOINTMENT_FILE = "data/appointment.json"
+MOOD_FILE = "data/patient_mood.json"
+
+
+def percentile(samples, p):
+    """
+    Returns the p-th percentile of a sorted list of samples (nearest rank).
+    """
+    rank = max(1, -(-len(samples) * p // 100))
+    return samples[min(rank, len(samples)) - 1]
+
+
+def measure(name, func, repeat, setup=None):
+    """
+    Runs func() repeat times, calling setup() untimed before each run, and
+    returns the statistics of the runs. Anything func prints is discarded.
+    """
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "name": name,
+        "runs": repeat,
+        "ops_per_sec": repeat / sum(samples) if sum(samples) else float("inf"),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+    }
+
+
+def print_report(rows, results):
+    print(f"\n{BOLD}{rows} rows{RESET}")
+    print(f"{'operation':<46}{'runs':>6}{'ops/s':>12}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    for result in results:
+        print(
+            f"{result['name']:<46}{result['runs']:>6}{result['ops_per_sec']:>12.1f}"
+            f"{result['p50'] * 1000:>11.3f}{result['p95'] * 1000:>11.3f}{result['p99'] * 1000:>11.3f}"
+        )
+
+
+def storage_benchmarks(repeat, rng):
+    """
+    Times the data handler functions on the appointment (JSON array) and mood (JSON Lines) files.
+    """
+    appointments = read_json(APPOINTMENT_FILE)
+    size = len(appointments)
+    new_appointment = dict(appointments[0], notes="Benchmark appointment.")
+    new_mood = dict(read_json(MOOD_FILE)[0], mood_comments="Benchmark mood.")
+    patient_id = appointments[0]["patient_id"]
+    return [
+        measure("read_json appointments (cold)", lambda: read_json(APPOINTMENT_FILE), repeat, setup=clear_cache),
+        measure("read_json appointments (cached)", lambda: read_json(APPOINTMENT_FILE), repeat),
+        measure("iter_json appointments (cold)", lambda: sum(1 for _ in iter_json(APPOINTMENT_FILE)), repeat, setup=clear_cache),
+        measure("save_json appointments", lambda: save_json(APPOINTMENT_FILE, appointments), repeat),
+        measure("add_entry appointments", lambda: add_entry(APPOINTMENT_FILE, new_appointment), repeat),
+        measure("add_entry moods (JSON Lines)", lambda: add_entry(MOOD_FILE, new_mood), repeat),
+        measure("update_entry appointments", lambda: update_entry(APPOINTMENT_FILE, rng.randint(1, size), {"notes": "Updated."}), repeat),
+        measure("delete_entry appointments", lambda: delete_entry(APPOINTMENT_FILE, rng.randint(1, size - repeat)), repeat),
+        measure("get_by appointments patient_id", lambda: get_by(APPOINTMENT_FILE, "patient_id", patient_id), repeat),
+        measure("find_entries appointments", lambda: find_entries(APPOINTMENT_FILE, patient_id=patient_id, status="CONFIRMED"), repeat),
+    ]
+
+
+def controller_benchmarks(repeat):
+    """
+    Times the controller screens that query the data files, as the first user of each role.
+    """
+    users = read_json("data/user.json")
+    patient_info = get_by("data/patient_info.json", "patient_id", 1)[0]
+    mhwp_id = patient_info["mhwp_id"]
+    mhwp_info = get_by("data/mhwp_info.json", "mhwp_id", mhwp_id)[0]
+    admin_id = next(user["user_id"] for user in users if user["role"] == "admin")
+
+    patient = Patient(1, "patient1", "", patient_info["name"], patient_info["email"], patient_info["emergency_contact_email"], mhwp_id, "ACTIVE")
+    mhwp = MHWP(mhwp_id, f"mhwp{mhwp_id}", "", mhwp_info["name"], mhwp_info["email"], mhwp_info["patient_count"], "ACTIVE")
+    patient_controller = PatientController(patient)
+    mhwp_controller = MHWPController(mhwp)
+    admin_controller = AdminController(Admin(admin_id, "admin", "", "ACTIVE"))
+
+    def make_appointment():
+        # Picks the first available date and time slot
+        with mock.patch("builtins.input", side_effect=["1", "1"]):
+            patient_controller.make_appointment()
+
+    return [
+        measure("PatientController.get_upcoming_appointments", patient_controller.get_upcoming_appointments, repeat),
+        measure("MHWPController.get_upcoming_appointments", mhwp_controller.get_upcoming_appointments, repeat),
+        measure("MHWPController.view_dashboard", mhwp_controller.view_dashboard, repeat),
+        measure("PatientController.make_appointment", make_appointment, repeat),
+        measure("AdminController.view_weekly_bookings_summary", admin_controller.view_weekly_bookings_summary, repeat),
+    ]
+
+
+def run(rows, repeat, seed=0):
+    """
+    Generates a data set with the given number of rows and returns the results of every benchmark on it.
+    """
+    directory = tempfile.mkdtemp(prefix="breeze_bench_")
+    cwd = os.getcwd()
+    try:
+        generate(os.path.join(directory, "data"), rows, seed)
+        os.chdir(directory)
+        clear_cache()
+        rng = random.Random(seed)
+        return storage_benchmarks(repeat, rng) + controller_benchmarks(repeat)
+    finally:
+        os.chdir(cwd)
+        clear_cache()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Breeze storage layer on generated data.")
+    parser.add_argument("--sizes", default="1000", help="comma separated numbers of rows, e.g. 1000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=10, help="runs of each operation per size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for rows in (int(size) for size in args.sizes.split(",")):
+        print_report(rows, run(rows, args.repeat, args.seed))
@@ -0,0 +1,161 @@
+"""
+Generates a synthetic copy of the data directory at a chosen size.
+
+Every data/*.json file is filled with seeded random entries whose foreign
+keys are consistent: each patient is assigned an existing MHWP, appointments
+reference existing patients and MHWPs, and feedback and resources reference
+existing appointments. Dates are spread around today, so that the "upcoming"
+and "this week" screens have something to find.
+
+    python -m benchmarks.generate_data --rows 100000 --out /tmp/breeze_data
+"""
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from utils.data_handler import is_json_lines_file
+
+
+TIME_SLOTS = ["09:00 - 10:00", "10:00 - 11:00", "11:00 - 12:00", "14:00 - 15:00", "15:00 - 16:00", "16:00 - 17:00"]
+APPOINTMENT_STATUSES = ["PENDING", "CONFIRMED", "CONFIRMED", "CANCELLED"]
+MOOD_COLORS = ["1_red", "2_light_red", "3_orange", "4_yellow", "5_light_green", "6_green"]
+CONDITIONS = ["Anxiety", "ADHD", "Depression", "Stress", "PTSD", "Bipolar Disorder", "OCD", "Panic Disorder", "Social Anxiety", "GAD (Generalized Anxiety Disorder)"]
+REQUEST_STATUSES = ["pending", "approved", "rejected"]
+FIRST_NAMES = ["John", "Jane", "Alex", "Maria", "Wei", "Aisha", "Tom", "Lena", "Omar", "Sofia"]
+LAST_NAMES = ["Doe", "Smith", "Chen", "Garcia", "Khan", "Brown", "Rossi", "Novak", "Sato", "Evans"]
+
+
+def collection_sizes(rows):
+    """
+    Returns the number of patients and MHWPs for a data set whose large
+    collections (appointments, moods, journals, ...) have the given number of rows.
+    """
+    patients = max(20, rows // 50)
+    mhwps = max(5, patients // 20)
+    return patients, mhwps
+
+
+def _timestamp(rng, today, days):
+    moment = today + timedelta(days=rng.randint(-days, days), seconds=rng.randint(0, 86399))
+    return moment.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def generate(directory, rows, seed=0):
+    """
+    Writes every data file to directory. Returns {file name: number of entries}.
+    """
+    rng = random.Random(seed)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    patient_count, mhwp_count = collection_sizes(rows)
+    patient_ids = list(range(1, patient_count + 1))
+    mhwp_ids = list(range(patient_count + 1, patient_count + mhwp_count + 1))
+    admin_id = patient_count + mhwp_count + 1
+
+    def name(user_id):
+        return f"{FIRST_NAMES[user_id % len(FIRST_NAMES)]} {LAST_NAMES[(user_id // len(FIRST_NAMES)) % len(LAST_NAMES)]} {user_id}"
+
+    users = [{"user_id": user_id, "username": f"patient{user_id}", "password": "", "role": "patient", "status": "ACTIVE"} for user_id in patient_ids]
+    users += [{"user_id": user_id, "username": f"mhwp{user_id}", "password": "", "role": "mhwp", "status": "ACTIVE"} for user_id in mhwp_ids]
+    users.append({"user_id": admin_id, "username": "admin", "password": "", "role": "admin", "status": "ACTIVE"})
+
+    patient_mhwp = {patient_id: mhwp_ids[(patient_id - 1) % mhwp_count] for patient_id in patient_ids}
+    patient_info = [{
+        "patient_id": patient_id,
+        "name": name(patient_id),
+        "email": f"patient{patient_id}@example.com",
+        "emergency_contact_email": f"emergency{patient_id}@example.com",
+        "mhwp_id": patient_mhwp[patient_id],
+        "mood_code": rng.randint(1, 6),
+    } for patient_id in patient_ids]
+    patient_record = [{
+        "patient_id": patient_id,
+        "condition": rng.choice(CONDITIONS),
+        "notes": "Generated record.",
+        "name": name(patient_id),
+    } for patient_id in patient_ids]
+    mhwp = [{"mhwp_id": mhwp_id, "name": name(mhwp_id), "email": f"mhwp{mhwp_id}@example.com"} for mhwp_id in mhwp_ids]
+    mhwp_info = [dict(entry, patient_count=sum(1 for m in patient_mhwp.values() if m == entry["mhwp_id"])) for entry in mhwp]
+
+    appointments = []
+    for appointment_id in range(1, rows + 1):
+        patient_id = rng.choice(patient_ids)
+        created = _timestamp(rng, today, 120)
+        appointments.append({
+            "appointment_id": appointment_id,
+            "patient_id": patient_id,
+            "mhwp_id": patient_mhwp[patient_id],
+            "date": (today + timedelta(days=rng.randint(-90, 30))).strftime("%Y-%m-%d"),
+            "time_slot": rng.choice(TIME_SLOTS),
+            "status": rng.choice(APPOINTMENT_STATUSES),
+            "notes": "",
+            "create_time": created,
+            "last_updated": created,
+        })
+
+    # Every patient gets at least one mood entry, the dashboard expects one
+    moods = [{
+        "patient_id": patient_ids[i] if i < patient_count else rng.choice(patient_ids),
+        "timestamp": _timestamp(rng, today, 120),
+        "mood_color": rng.choice(MOOD_COLORS),
+        "mood_comments": "Generated comment.",
+    } for i in range(max(rows, patient_count))]
+    journals = [{
+        "patient_id": rng.choice(patient_ids),
+        "timestamp": _timestamp(rng, today, 120),
+        "journal_text": "Generated journal entry.",
+    } for _ in range(rows)]
+    feedback = [{
+        "appointment_id": rng.randint(1, rows),
+        "feedback": "Generated feedback.",
+        "create_time": _timestamp(rng, today, 120),
+    } for _ in range(rows // 4)]
+    resources = [{
+        "appointment_id": rng.randint(1, rows),
+        "resource_name": "Generated resource",
+        "resource_link": "https://www.nhs.uk/mental-health/",
+        "create_time": _timestamp(rng, today, 120),
+    } for _ in range(rows // 2)]
+    requests = []
+    for _ in range(max(1, rows // 20)):
+        patient_id = rng.choice(patient_ids)
+        requests.append({
+            "patient_id": patient_id,
+            "current_mhwp_id": patient_mhwp[patient_id],
+            "target_mhwp_id": rng.choice(mhwp_ids),
+            "reason": "Generated request",
+            "status": rng.choice(REQUEST_STATUSES),
+            "requested_at": _timestamp(rng, today, 120).replace("T", " "),
+        })
+
+    files = {
+        "user.json": users,
+        "patient_info.json": patient_info,
+        "patient_record.json": patient_record,
+        "mhwp.json": mhwp,
+        "mhwp_info.json": mhwp_info,
+        "appointment.json": appointments,
+        "patient_mood.json": moods,
+        "patient_journal.json": journals,
+        "feedback.json": feedback,
+        "mhwp_resources.json": resources,
+        "request_log.json": requests,
+    }
+    os.makedirs(directory, exist_ok=True)
+    for file_name, entries in files.items():
+        with open(os.path.join(directory, file_name), 'w') as file:
+            if is_json_lines_file(file_name):
+                file.writelines(json.dumps(entry) + "\n" for entry in entries)
+            else:
+                json.dump(entries, file, indent=4)
+    return {file_name: len(entries) for file_name, entries in files.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Breeze data directory.")
+    parser.add_argument("--rows", type=int, default=1000, help="number of appointments, moods and journal entries")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="directory to write the data files to")
+    args = parser.parse_args()
+    for file_name, count in generate(args.out, args.rows, args.seed).items():
+        print(f"{file_name}: {count} entries")
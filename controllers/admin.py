@@ -1,11 +1,13 @@
-import pandas as pd
 import json
 import logging
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 from models.user import Admin, MHWP, Patient
 from utils.display_manager import DisplayManager
 from utils.data_handler import *
+from utils.appointments import get_calendar
+from utils.request_queue import PENDING, get_request_queue
+from utils.cascade import cascade_delete
 
 """
 ==================================
@@ -128,6 +130,7 @@ class AdminController:
             "View MHWPs Summary",
             "View Allocations",
             "View Weekly Confirmed Bookings",
+            "Check MHWP Patient Counts",
             "Back to Homepage"
         ]
         action_map = {
@@ -135,7 +138,8 @@ class AdminController:
             "2": self.view_mhwps_summary,
             "3": self.view_allocations_summary,
             "4": self.view_weekly_bookings_summary,
-            "5": lambda: None  
+            "5": self.view_patient_count_check,
+            "6": lambda: None  
         }
         result = self.display_manager.navigate_menu(title, options, action_map, main_menu_title)
         if result == "main_menu":
@@ -182,7 +186,7 @@ class AdminController:
             "MHWP ID": [p.get("mhwp_id", None) for p in patient_info],
             }
             if data["Patient ID"]:
-                create_table(data, "Patient Information", display_title=True, display_index=False)
+                create_table(data, "Patient Information", display_title=True, display_index=False, page_size=TABLE_PAGE_SIZE)
                 return data
     
     def display_mhwp_info(self):
@@ -207,10 +211,65 @@ class AdminController:
                 create_table(data, "MHWP Information", display_title=True, display_index=False)
                 return data
      
+    def assign_patient(self, patient_id, mhwp_id):
+        """
+        Assign a patient to an MHWP and move the patient counts along with it.
+        The patient is found through the patient_id index under the file lock, and the
+        MHWP it is moved from is read from that entry rather than from a table shown earlier.
+        Call it inside a group_commit. Returns False if the patient or a change could not be saved.
+        """
+        with file_lock(self.patient_info_file, exclusive=True):
+            position = get_position(self.patient_info_file, "patient_id", patient_id)
+            if position is None:
+                return False
+            old_mhwp_id = get_by(self.patient_info_file, "patient_id", patient_id)[0].get("mhwp_id")
+            if not update_entry(self.patient_info_file, position, {"mhwp_id": mhwp_id}):
+                return False
+        return self.move_patient_count(self.mhwp_info_file, old_mhwp_id, mhwp_id)
+
+    @staticmethod
+    def move_patient_count(mhwp_file, old_mhwp_id, new_mhwp_id):
+        """
+        Update the patient_count of the MHWPs a patient is moved between, as a -1/+1 delta.
+        Call it inside the group_commit of the allocation so both are saved together.
+        :param mhwp_file: The file path to the JSON file containing MHWP information.
+        :param old_mhwp_id: The MHWP the patient was assigned to, or None.
+        :param new_mhwp_id: The MHWP the patient is now assigned to, or None.
+        """
+        if old_mhwp_id == new_mhwp_id:
+            return True
+        if old_mhwp_id is not None and not increment_field(mhwp_file, "mhwp_id", old_mhwp_id, "patient_count", -1, minimum=0):
+            return False
+        if new_mhwp_id is not None and not increment_field(mhwp_file, "mhwp_id", new_mhwp_id, "patient_count", 1):
+            return False
+        return True
+
+    @staticmethod
+    def check_patient_counts(patient_file, mhwp_file):
+        """
+        Compare the stored patient_count of each MHWP with the number of patients assigned to it.
+        :param patient_file: The file path to the JSON file containing patient information.
+        :param mhwp_file: The file path to the JSON file containing MHWP information.
+        :return: A list of (mhwp_id, stored count, actual count) for the MHWPs whose count is wrong.
+        """
+        mhwp_patient_counts = {}
+        for patient in iter_json(patient_file):
+            mhwp_id = patient.get("mhwp_id")
+            if mhwp_id is not None:
+                mhwp_patient_counts[mhwp_id] = mhwp_patient_counts.get(mhwp_id, 0) + 1
+
+        return [
+            (mhwp.get("mhwp_id"), mhwp.get("patient_count"), mhwp_patient_counts.get(mhwp.get("mhwp_id"), 0))
+            for mhwp in iter_json(mhwp_file)
+            if mhwp.get("patient_count") != mhwp_patient_counts.get(mhwp.get("mhwp_id"), 0)
+        ]
+
     @staticmethod
     def calculate_patient_counts(patient_file, mhwp_file):
         """
         Calculate the number of patients assigned to each MHWP and update the patient_count field in mhwp_file.
+        Counts are kept up to date by move_patient_count; this full recount repairs them
+        when check_patient_counts finds a mismatch.
         :param patient_file: The file path to the JSON file containing patient information.
         :param mhwp_file: The file path to the JSON file containing MHWP information.
         """
@@ -301,9 +360,14 @@ class AdminController:
                     print(f"{RED}Patient ID {input_patient_id} is already assigned to MHWP ID {input_mhwp_id}.{RESET}")
                     continue
                 # If not assigned to the same MHWP, proceed to update               
-                update_entry(self.patient_info_file, input_patient_id, {"mhwp_id": input_mhwp_id})
+                try:
+                    with group_commit():
+                        if not self.assign_patient(input_patient_id, input_mhwp_id):
+                            raise OSError(f"Patient {input_patient_id} could not be assigned")
+                except OSError:
+                    print(f"{RED}The allocation could not be saved, please try again.{RESET}")
+                    break
                 print(f"{GREEN}MHWP ID {input_mhwp_id} found. Successfully assigned Patient {input_patient_id} to MHWP {input_mhwp_id}! {RESET}")
-                self.calculate_patient_counts(self.patient_info_file, self.mhwp_info_file)
                 break
 
             else:
@@ -320,44 +384,60 @@ class AdminController:
 # ----------------------------------
 # Section 2: Resolve Patient Requests
 # ----------------------------------
-    def display_request_info(self):
-        """Retrieve and display request information"""
-        request_info = read_json(self.request_log_file)
-        requests_sorted = sorted(request_info, key=lambda x: datetime.strptime(x["requested_at"], "%Y-%m-%d %H:%M:%S"), reverse=True)
-
-        if requests_sorted is None or not isinstance(requests_sorted, list):
-            print(f"{RED}Error: Failed to read valid data.")
-            return None
+    def display_request_info(self, show_all=False):
+        """
+        Display the pending requests, oldest first, or the whole request log if show_all,
+        grouped by status with the pending requests first.
+        Returns the (position, request) pairs shown, in display order.
+        """
+        queue = get_request_queue(self.request_log_file)
+        if show_all:
+            counts = queue.counts()
+            resolved = sorted(status for status in counts if status != PENDING)
+            requests_shown = queue.pending() + [pair for status in resolved for pair in queue.with_status(status)]
+            summary = ", ".join(f"{counts[status]} {status}" for status in [PENDING] * (PENDING in counts) + resolved)
+            title = f"Request Log Information ({summary})" if summary else "Request Log Information"
         else:
-            data = {
-                "Patient ID": [r.get("patient_id", None) for r in request_info],
-                "Current MHWP ID": [r.get("current_mhwp_id") for r in request_info],
-                "Target MHWP ID": [r.get("target_mhwp_id") for r in request_info],
-                "Reason": [r.get("reason") for r in request_info],
-                "Status": [r.get("status") for r in request_info],
-                "Requested At": [r.get("requested_at") for r in request_info]
-            }
-            if data["Patient ID"]:
-                create_table(data, "Request Log Information", display_title=True, display_index=True)
-                return data
+            requests_shown = queue.pending()
+            title = "Pending Requests"
 
+        if not requests_shown:
+            create_table({}, title=title, no_data_message="No Requests Found" if show_all else "No Pending Requests", display_title=True, display_index=False)
+            return requests_shown
 
-    def check_request_is_not_pending(self, index):
-        """ Check if the request is not pending"""
-        request_info = read_json(self.request_log_file)
+        request_info = [r for _, r in requests_shown]
+        data = {
+            "Patient ID": [r.get("patient_id", None) for r in request_info],
+            "Current MHWP ID": [r.get("current_mhwp_id") for r in request_info],
+            "Target MHWP ID": [r.get("target_mhwp_id") for r in request_info],
+            "Reason": [r.get("reason") for r in request_info],
+            "Status": [r.get("status") for r in request_info],
+            "Requested At": [r.get("requested_at") for r in request_info]
+        }
+        create_table(data, title, display_title=True, display_index=True, page_size=TABLE_PAGE_SIZE)
+        return requests_shown
 
-        specific_request = request_info[index-1]
-        status = specific_request["status"]
 
-        if status != "pending":
-            return True
-        return False
+    def settle_request(self, position, request, status):
+        """
+        Set the status of a pending request in place, at its 0-based position in the request log.
+        Returns False if it is no longer pending, e.g. another admin resolved it meanwhile.
+        """
+        with file_lock(self.request_log_file, exclusive=True):
+            current = get_request_queue(self.request_log_file).request_at(position)
+            if current != request or current.get("status") != "pending":
+                return False
+            return update_entry(self.request_log_file, position + 1, {"status": status})
 
 
     def resolve_request(self):
         """ Resolve patient requests of changing MHWP """
-        self.display_request_info()
-        request_data = read_json(self.request_log_file)
+        requests_shown = self.display_request_info()
+        if not requests_shown:
+            self.display_manager.back_operation()
+            self.display_admin_homepage()
+            return
+        print(f"{GREY}Enter 'all' to view the whole request log.{RESET}")
 
         # Ask for Patient ID to allocate
         retry_attempts = 0
@@ -367,6 +447,10 @@ class AdminController:
                 self.display_manager.back_operation()
                 self.display_admin_homepage()
                 return
+            if input_index == "all":
+                self.display_request_info(show_all=True)
+                self.display_request_info()
+                continue
             
             # Validate if input is an integer
             if not self.is_integer(input_index):
@@ -375,18 +459,13 @@ class AdminController:
                 continue
             
             input_index = int(input_index)
-            # Check if the input patient ID exists and proceed to allocate
-            if not (input_index <= len(request_data) and input_index > 0):
+            # Check if the input index is one of the pending requests shown
+            if not (input_index <= len(requests_shown) and input_index > 0):
                 retry_attempts += 1
                 print(f"{RED}Index not found. Please try again.{RESET}")
                 continue
 
-            if self.check_request_is_not_pending(input_index):
-                retry_attempts += 1
-                print(f"{RED}Please select a request with a pending status.{RESET}")
-                continue
-
-            specific_record_info = request_data[input_index-1]
+            position, specific_record_info = requests_shown[input_index-1]
 
             while True:
                 # Display a simple menu for editing mhwp data
@@ -406,23 +485,31 @@ class AdminController:
                 
                 # Approve request
                 if choice == "1":
-                    request_data[input_index-1]['status'] = "approved"
-                    save_json(self.request_log_file, request_data)
-                    patient_id = request_data[input_index-1]['patient_id']
-                    target_MHWP_id = request_data[input_index-1]['target_mhwp_id']
+                    patient_id = specific_record_info['patient_id']
+                    target_MHWP_id = specific_record_info['target_mhwp_id']
 
-                    #update patient file to new MHWP           
-                    update_entry(self.patient_info_file, patient_id, {"mhwp_id": target_MHWP_id})
+                    # Save the request, the new allocation and the patient counts together
+                    try:
+                        with group_commit():
+                            saved = self.settle_request(position, specific_record_info, "approved")
+                            if saved and not self.assign_patient(patient_id, target_MHWP_id):
+                                raise OSError(f"Patient {patient_id} could not be assigned")
+                    except OSError:
+                        print(f"{RED}The request could not be settled, please try again.{RESET}")
+                        return
+                    if not saved:
+                        print(f"{RED}This request is no longer pending, it was resolved by someone else.{RESET}")
+                        return
                     print(f"{GREEN}Request settled. Successfully assigned Patient {patient_id} to MHWP {target_MHWP_id}! {RESET}")
-                    self.calculate_patient_counts(self.patient_info_file, self.mhwp_info_file)
                     return
 
                 # Reject request
                 elif choice == "2":
-                    request_data[input_index-1]['status'] = "rejected"
-                    patient_id = request_data[input_index-1]['patient_id']
+                    patient_id = specific_record_info['patient_id']
+                    if not self.settle_request(position, specific_record_info, "rejected"):
+                        print(f"{RED}This request is no longer pending, it was resolved by someone else.{RESET}")
+                        return
                     print(f"{RED}Request settled. Rejected Patient {patient_id}'s request. {RESET}")
-                    save_json(self.request_log_file, request_data)
                     return
                 
                 else:
@@ -448,7 +535,7 @@ class AdminController:
     def edit_mhwp(self):
         # Display MHWP info
         self.display_mhwp_info()
-        data = read_json(self.mhwp_info_file)
+        data, version = read_json_versioned(self.mhwp_info_file)
 
         while True:
             input_mhwp_id = input(f"{CYAN}{BOLD}Enter MHWP ID to edit ⏳: {RESET}").strip()
@@ -523,8 +610,10 @@ class AdminController:
                         else:
                             print(f"{RED}Invalid choice. Please try again.")
 
-                    # Save the updated data
-                    save_json(self.mhwp_info_file, data)
+                    # Save the updated data, unless another session changed the file meanwhile
+                    if not save_json(self.mhwp_info_file, data, expected_version=version):
+                        print(f"{RED}MHWP information was changed by someone else. Your changes were not saved, please try again.{RESET}")
+                        return
 
             # If MHWP ID not found
             if mhwp_found == False:
@@ -534,7 +623,7 @@ class AdminController:
     def edit_patient(self):
         # Display patient info
         self.display_patient_info()
-        data = read_json(self.patient_info_file)
+        data, version = read_json_versioned(self.patient_info_file)
         
         while True:
             input_patient_id = input(f"{CYAN}{BOLD}Enter Patient ID to edit ⏳: {RESET}").strip()
@@ -633,8 +722,18 @@ class AdminController:
                             print(f"{RED}Invalid choice. Please try again.")
 
                     # Save the updated data
-                    save_json(self.patient_info_file, data)
-                    update_entry(self.patient_record_file, input_patient_id, {"name": new_name})
+                    try:
+                        with group_commit():
+                            saved = save_json(self.patient_info_file, data, expected_version=version)
+                            if saved:
+                                with file_lock(self.patient_record_file, exclusive=True):
+                                    record_position = get_position(self.patient_record_file, "patient_id", input_patient_id)
+                                    if record_position is not None:
+                                        update_entry(self.patient_record_file, record_position, {"name": patient["name"]})
+                    except OSError:
+                        saved = False
+                    if not saved:
+                        print(f"{RED}Patient information was changed by someone else. Your changes were not saved, please try again.{RESET}")
                     break
 
             # If MHWP ID not found
@@ -773,6 +872,12 @@ class AdminController:
 # ----------------------------
 # Section 5: Delete User
 # ----------------------------
+    @staticmethod
+    def print_deleted_counts(deleted):
+        """Print the number of entries a cascading delete removed from each data file"""
+        for file_path, count in deleted.items():
+            print(f"{GREY}  {os.path.basename(file_path)}: {count} deleted{RESET}")
+
     def delete_mhwp(self):
         """Delete an MHWP account"""
         # Display MHWP info
@@ -799,8 +904,7 @@ class AdminController:
             input_mhwp_id = int(input_mhwp_id)
             if input_mhwp_id in mhwp_data.get("MHWP ID", []):
                 # Check for existing relationships with patients
-                patient_data = read_json(self.patient_info_file)
-                patients_assigned = [p for p in patient_data if p.get("mhwp_id") == input_mhwp_id]
+                patients_assigned = get_by(self.patient_info_file, "mhwp_id", input_mhwp_id)
                 if patients_assigned:
                     print(f"{RED}Cannot delete MHWP with assigned patients. Please reassign patients first.{RESET}")
                     self.display_manager.back_operation()
@@ -824,12 +928,10 @@ class AdminController:
                     return
 
                 # Check for pending requests
-                request_data = read_json(self.request_log_file)
                 requests_assigned = [
-                    req for req in request_data 
-                    if (req.get("current_mhwp_id") == input_mhwp_id or 
-                        req.get("target_mhwp_id") == input_mhwp_id) and 
-                    req.get("status") == "pending"
+                    req for _, req in get_request_queue(self.request_log_file).pending()
+                    if req.get("current_mhwp_id") == input_mhwp_id or 
+                        req.get("target_mhwp_id") == input_mhwp_id
                 ]
                 if requests_assigned:
                     print(f"{RED}MHWP has pending patient transfer requests. Please handle these requests first.{RESET}")
@@ -841,17 +943,13 @@ class AdminController:
                 confirm = input(f"{ORANGE}Are you sure you want to delete MHWP {input_mhwp_id}? (yes/no): {RESET}").strip().lower()
                 if confirm == "yes":
                     try:
-                        # Delete from all relevant files
-                        mhwp_file_paths = [
-                            self.mhwp_info_file,
-                            self.user_info_file
-                        ]
-                        for file_path in mhwp_file_paths:
-                            data = read_json(file_path)
-                            data = [m for m in data if m.get("mhwp_id", m.get("user_id")) != input_mhwp_id]
-                            save_json(file_path, data)
-                        
+                        # Delete the account and everything referring to it in one commit
+                        deleted = cascade_delete(self.user_info_file, "user_id", input_mhwp_id)
+                        if deleted is None:
+                            print(f"{RED}Cannot delete MHWP with assigned patients. Please reassign patients first.{RESET}")
+                            break
                         print(f"{GREEN}Successfully deleted MHWP {input_mhwp_id}!{RESET}")
+                        self.print_deleted_counts(deleted)
                         break
                     except IOError as e:
                         print(f"{RED}An error occurred while deleting MHWP data: {e}{RESET}")
@@ -899,34 +997,19 @@ class AdminController:
                 if confirm == "yes":
                     try:
                         # Get MHWP ID before deletion for patient count update
-                        patient_info = read_json(self.patient_info_file)
-                        patient_entry = next((p for p in patient_info if p["patient_id"] == input_patient_id), None)
+                        patient_entry = next(iter(get_by(self.patient_info_file, "patient_id", input_patient_id)), None)
                         mhwp_id = patient_entry.get("mhwp_id") if patient_entry else None
 
-                        # Delete from all relevant files
-                        patient_file_paths = [
-                            self.appointment_file,
-                            self.patient_info_file,
-                            self.journal_file,
-                            self.mood_file,
-                            self.patient_record_file,
-                            self.user_info_file
-                        ]
-                        
-                        for file_path in patient_file_paths:
-                            data = read_json(file_path)
-                            data = [p for p in data if p.get("patient_id", p.get("user_id")) != input_patient_id]
-                            save_json(file_path, data)
-
-                        # Update MHWP patient count if patient was assigned
-                        if mhwp_id:
-                            mhwp_data = read_json(self.mhwp_info_file)
-                            for mhwp in mhwp_data:
-                                if mhwp["mhwp_id"] == mhwp_id:
-                                    mhwp["patient_count"] = max(0, mhwp["patient_count"] - 1)
-                            save_json(self.mhwp_info_file, mhwp_data)
+                        # Delete the account and everything referring to it, and update
+                        # the MHWP patient count, in one commit
+                        with group_commit():
+                            deleted = cascade_delete(self.user_info_file, "user_id", input_patient_id)
+                            if mhwp_id and not self.move_patient_count(self.mhwp_info_file, mhwp_id, None):
+                                # Rolls back the deletes too
+                                raise OSError(f"Failed to update the patient count of MHWP {mhwp_id}")
 
                         print(f"{GREEN}Successfully deleted Patient {input_patient_id}!{RESET}")
+                        self.print_deleted_counts(deleted)
                         break
                     except IOError as e:
                         print(f"{RED}An error occurred while deleting patient data: {e}{RESET}")
@@ -991,44 +1074,49 @@ class AdminController:
             }
             create_table(data, title="Patient Allocations", display_title=True, display_index=False)
 
+    def view_patient_count_check(self):
+        """Checks the stored MHWP patient counts against the allocations and offers to repair them"""
+        mismatches = self.check_patient_counts(self.patient_info_file, self.mhwp_info_file)
+        if not mismatches:
+            print(f"{GREEN}All MHWP patient counts are consistent.{RESET}")
+            return
+
+        data = {
+            "MHWP ID": [m[0] for m in mismatches],
+            "Stored Count": [m[1] for m in mismatches],
+            "Actual Count": [m[2] for m in mismatches],
+        }
+        create_table(data, title="Inconsistent Patient Counts", display_title=True, display_index=False)
+        confirm = input(f"{ORANGE}Recalculate all MHWP patient counts? (yes/no): {RESET}").strip().lower()
+        if confirm == "yes":
+            self.calculate_patient_counts(self.patient_info_file, self.mhwp_info_file)
+            print(f"{GREEN}Patient counts recalculated.{RESET}")
+        else:
+            print(f"{GREY}Patient counts left unchanged.{RESET}")
+
     def view_weekly_bookings_summary(self):
         """Displays the count of weekly confirmed bookings per MHWP"""
-        appointment_file = self.appointment_file
-        appointments = read_json(appointment_file)
+        # Read from the per-week counters instead of parsing the date of every appointment
+        calendar = get_calendar(self.appointment_file)
+        appointments_found = len(calendar) > 0
+        mhwp_bookings = calendar.weekly_counts(datetime.now().date(), "CONFIRMED")
+        for appointment in calendar.undated():
+            if appointment.get("status") == "CONFIRMED":
+                print(f"{RED}Invalid date format in appointment ID: {appointment.get('appointment_id')}{RESET}")
 
-        if not appointments:
+        if not appointments_found:
             create_table({}, title="Weekly Confirmed Bookings", no_data_message="No Appointments Found", display_title=True, display_index=False)
             return
 
-        today = datetime.now()
-        start_of_week = today - timedelta(days=today.weekday()) 
-        end_of_week = start_of_week + timedelta(days=6)  
-       
-        confirmed_appointments = []
-        for appointment in appointments:
-            if appointment.get("status") == "CONFIRMED":
-                try:
-                    appointment_date = datetime.strptime(appointment["date"], "%Y-%m-%d")
-                    if start_of_week <= appointment_date <= end_of_week:
-                        confirmed_appointments.append(appointment)
-                except ValueError:
-                    print(f"{RED}Invalid date format in appointment ID: {appointment.get('appointment_id')}{RESET}")
-                    continue
-
-        if not confirmed_appointments:
+        if not mhwp_bookings:
             create_table({}, title="Weekly Confirmed Bookings", no_data_message="No Confirmed Appointments for the Current Week", display_title=True, display_index=False)
             return
 
-        mhwp_bookings = {}
-        for appointment in confirmed_appointments:
-            mhwp_id = appointment.get("mhwp_id", "N/A")
-            mhwp_bookings[mhwp_id] = mhwp_bookings.get(mhwp_id, 0) + 1
-
         data = {
             "MHWP ID": list(mhwp_bookings.keys()),
             "Confirmed Bookings": list(mhwp_bookings.values()),
         }
         create_table(data, title="Weekly Confirmed Bookings", display_title=True, display_index=False)
-        total_confirmed = len(confirmed_appointments)
+        total_confirmed = sum(mhwp_bookings.values())
         print(f"\n{GREEN}{BOLD}Total Confirmed Appointments for This Week: {total_confirmed}{RESET}\n")
 
@@ -1,8 +1,8 @@
 from models.user import MHWP
-import pandas as pd
 from datetime import datetime, timedelta
 from utils.display_manager import DisplayManager
 from utils.data_handler import *
+from utils.appointments import get_appointment_details, get_calendar
 from utils.email_helper import send_email
 
 """
@@ -24,6 +24,9 @@ LIGHT_YELLOW = "\033[93m"
 ITALIC = "\033[3m"
 ORANGE = "\033[1;33m"  
 
+# Number of most recent moods shown per patient on the dashboard
+DASHBOARD_MOOD_LIMIT = 5
+
 
 """
 ==================================
@@ -49,7 +52,13 @@ class MHWPController:
         self.mwhp_resources_file = "data/mhwp_resources.json"
         self.feedback_file = "data/feedback.json"
         self.mood_file = "data/patient_mood.json"
+        self.mhwp_info_file = "data/mhwp_info.json"
+        self.appointment_details = get_appointment_details(
+            self.appointment_file, self.patient_info_file, self.mhwp_info_file, self.feedback_file, self.mwhp_resources_file
+        )
         self.skip_upcoming_appointments = False
+        self._snapshot = None
+        self.dashboard_mood_limit = DASHBOARD_MOOD_LIMIT
 
 
 # ----------------------------
@@ -79,7 +88,7 @@ class MHWPController:
             
         # Display upcoming appointments if not disabled
         if not self.skip_upcoming_appointments:
-            upcoming_appointments = self.get_upcoming_appointments()
+            upcoming_appointments = self.run_action(self.get_upcoming_appointments)
             # Sort upcoming appointments by date and time
             upcoming_appointments.sort(key=lambda x: (x['date'], x['time_slot']))
             if upcoming_appointments:
@@ -107,10 +116,10 @@ class MHWPController:
         main_menu_title = "🏠 MHWP HomePage"
         options = ["View Appointments", "Handle Appointments", "Suggest Resources", "View Feedback", "Back to Homepage"]
         action_map = {
-            "1": self.view_calendar,
-            "2": self.choose_appointment,
-            "3": self.suggest_resources,
-            "4": self.view_feedback,
+            "1": lambda: self.run_action(self.view_calendar),
+            "2": lambda: self.run_action(self.choose_appointment),
+            "3": lambda: self.run_action(self.suggest_resources),
+            "4": lambda: self.run_action(self.view_feedback),
             "5": lambda: None
         }
         result = self.display_manager.navigate_menu(title, options, action_map, main_menu_title)
@@ -122,9 +131,9 @@ class MHWPController:
         main_menu_title = "🏠 MHWP HomePage"
         options = ["View Patient Dashboard", "Update Patient Dashboard", "Email Emergency Contact", "Back to Homepage"]
         action_map = {
-            "1": self.view_dashboard,
-            "2": self.update_patient_record,
-            "3": self.contact_emergency,
+            "1": lambda: self.run_action(self.view_dashboard),
+            "2": lambda: self.run_action(self.update_patient_record),
+            "3": lambda: self.run_action(self.contact_emergency),
             "4": lambda: None
         }
         result = self.display_manager.navigate_menu(title, options, action_map, main_menu_title)
@@ -136,38 +145,60 @@ class MHWPController:
 # -----------------------------------
 # Common Functions for Data Retrieval
 # -----------------------------------
+    @property
+    def snapshot(self):
+        '''Data loaded for the current user action, see run_action'''
+        if self._snapshot is None:
+            self._snapshot = Snapshot()
+        return self._snapshot
+
+    def run_action(self, action):
+        '''
+        Runs a menu action with a new snapshot, so that each data file the action
+        needs is read once however many lookups it makes, and the next action
+        sees the changes made in between.
+        '''
+        self._snapshot = None
+        try:
+            return action()
+        finally:
+            self._snapshot = None
+
+    def _patients_info(self):
+        return self.snapshot.get(
+            "patients_info", lambda: find_entries(self.patient_info_file, mhwp_id=self.mhwp.user_id), self.patient_info_file
+        )
+
     def get_patients_info(self):
         '''Returns a list of patient information for current MHWP'''
-        patient_info_payload = read_json(self.patient_info_file)
-        return [patient for patient in patient_info_payload if patient["mhwp_id"] == self.mhwp.user_id]
+        return [dict(patient) for patient in self._patients_info()]
+
+    def get_patient(self, patient_id):
+        '''Returns the information of one of the current MHWP's patients, or None'''
+        patients = self.snapshot.get(
+            "patients_by_id", lambda: {p["patient_id"]: p for p in reversed(self._patients_info())}, self.patient_info_file
+        )
+        patient = patients.get(patient_id)
+        return dict(patient) if patient is not None else None
 
     def get_patient_records(self):
         '''Returns a list of patient records for current MHWP'''
-        patient_record_payload = read_json(self.patient_record_file)
-        patients_info = self.get_patients_info()
-        patient_ids = set([patient["patient_id"] for patient in patients_info])
-        patient_records = [record for record in patient_record_payload if record["patient_id"] in patient_ids] 
-        return patient_records
+        def load_records():
+            patient_ids = {patient["patient_id"] for patient in self._patients_info()}
+            return [record for record in read_json(self.patient_record_file) if record["patient_id"] in patient_ids]
+        records = self.snapshot.get("patient_records", load_records, self.patient_info_file, self.patient_record_file)
+        return [dict(record) for record in records]
     
-    def get_patient_moods(self):
-        '''Returns a list of appointments for current MWHP'''
-        mood_data_payload = read_json(self.mood_file)
-        return mood_data_payload
-
     def get_appointments(self):
         '''Returns a list of appointments for current MWHP'''
-        appointment_payload = read_json(self.appointment_file)
-        return [appointment for appointment in appointment_payload if appointment["mhwp_id"] == self.mhwp.user_id]
+        appointments = self.snapshot.get(
+            "appointments", lambda: find_entries(self.appointment_file, mhwp_id=self.mhwp.user_id), self.appointment_file
+        )
+        return [dict(appointment) for appointment in appointments]
     
-    def get_feedback(self):
-        '''Returns a list of feedback for all appointments'''
-        appointment_payload = read_json(self.feedback_file)
-        return [appointment for appointment in appointment_payload]
-
     def get_patient_name(self, patient_id):
         '''Returns patient name from patients id'''
-        patients = self.get_patients_info()
-        patient = next((x for x in patients if x["patient_id"] == patient_id), None)
+        patient = self.get_patient(patient_id)
         if patient is None:
             print("Patient ID provided does not correspond to any patient")
         else:
@@ -191,44 +222,31 @@ class MHWPController:
     
     def get_upcoming_appointments(self):
         """Get appointments within the next 7 days for the MHWP."""
-        current_date = datetime.now()
-        seven_days_later = current_date + timedelta(days=7)
-
-        # Read appointment data
-        appointments = self.get_appointments()
-        if not appointments:
-            return []
+        today = datetime.now().date()
 
-        # Filter appointments within the next 7 days for the current mhwp
-        upcoming_appointments = []
-        for appointment in appointments:
-            appointment_date = datetime.strptime(appointment["date"], "%Y-%m-%d")
-            if current_date <= appointment_date <= seven_days_later:
-                # Find the Patient name based on patient_id
-                patient_name = self.get_patient_name(appointment["patient_id"])
-                appointment["patient_name"] = patient_name  # Add patient_name to the appointment
-                upcoming_appointments.append(appointment)
+        # Range read of the current MHWP's appointments from tomorrow to 7 days later
+        upcoming_appointments = get_calendar(self.appointment_file).between(
+            today + timedelta(days=1), today + timedelta(days=7), "mhwp_id", self.mhwp.user_id
+        )
+        for appointment in upcoming_appointments:
+            # Find the Patient name based on patient_id
+            patient_name = self.get_patient_name(appointment["patient_id"])
+            appointment["patient_name"] = patient_name  # Add patient_name to the appointment
 
         return upcoming_appointments
 
-    def get_patient_mood_data(self):
-        """Get mood data for patients of the current MHWP."""
-        patient_records = self.get_patient_records()
-        patient_moods_data = self.get_patient_moods()
-        
-        # Sort moods by timestamp in descending order
-        patient_moods_data.sort(key=lambda x: x["timestamp"], reverse=True)
-
-        patient_ids = set([record["patient_id"] for record in patient_records])
-
+    def get_patient_mood_data(self, limit=None):
+        """
+        Get mood data for patients of the current MHWP, most recent first.
+        If limit is given, only the limit most recent moods of each patient are kept.
+        """
         patient_moods = {}
-        for mood_data in patient_moods_data:
-            id = mood_data["patient_id"]
-            if id in patient_ids:
-                if not id in patient_moods:
-                    patient_moods[id] = []
-                patient_moods[id].append([mood_data["timestamp"], mood_data["mood_comments"], mood_data["mood_color"]])
-
+        for record in self.get_patient_records():
+            # Served from the per-patient mood index, so only this caseload's moods are looked at
+            id = record["patient_id"]
+            moods = get_latest(self.mood_file, "patient_id", id, "timestamp", limit)
+            if moods:
+                patient_moods[id] = [[m["timestamp"], m["mood_comments"], m["mood_color"]] for _, m in moods]
         return patient_moods
 
 
@@ -237,7 +255,8 @@ class MHWPController:
 # --------------------------------
     def view_calendar(self):
         """Display appointments for a MHWP."""
-        appointments = self.get_appointments()
+        # Appointments already joined with their patient's name
+        appointments = self.appointment_details.for_mhwp(self.mhwp.user_id)
 
         # Initialize data structure for displaying appointments
         data = {
@@ -252,7 +271,7 @@ class MHWPController:
         # Populate the data dictionary with appointment details
         for appointment in appointments:
             data["Appointment ID"].append(appointment["appointment_id"])
-            data["Name"].append(self.get_patient_name(appointment["patient_id"]))
+            data["Name"].append(appointment["patient_name"])
             data["Time"].append(appointment["time_slot"])
             data["Date"].append(appointment["date"])
             data["Status"].append(appointment["status"])
@@ -275,6 +294,30 @@ class MHWPController:
         )
 
 
+    def update_appointment(self, appointment_id, changes):
+        """
+        Apply changes to the appointment with an id, found through the appointment_id index
+        (ids are not positions once appointments have been deleted). Returns True on success.
+        """
+        with file_lock(self.appointment_file, exclusive=True):
+            position = get_position(self.appointment_file, "appointment_id", appointment_id)
+            updated = position is not None and update_entry(self.appointment_file, position, changes)
+        self.snapshot.discard(self.appointment_file)
+        return updated
+
+
+    def update_record(self, patient_id, changes):
+        """
+        Apply changes to the record of a patient, found through the patient_id index
+        (patient ids are not positions once records have been deleted). Returns True on success.
+        """
+        with file_lock(self.patient_record_file, exclusive=True):
+            position = get_position(self.patient_record_file, "patient_id", patient_id)
+            updated = position is not None and update_entry(self.patient_record_file, position, changes)
+        self.snapshot.discard(self.patient_record_file)
+        return updated
+
+
     def handle_appointment_status(self, appointment, isPending):
         """MHWP can handle the status of a Pending or Confirmed appointment."""
         appointments = self.get_appointments()
@@ -314,7 +357,8 @@ class MHWPController:
                 for app in appointments:
                     if app["appointment_id"] == appointment["appointment_id"]:
                         new_note = input("Please enter new note for the appointment: ")
-                        update_entry(self.appointment_file, appointment["appointment_id"], {"notes": new_note})
+                        if not self.update_appointment(appointment["appointment_id"], {"notes": new_note}):
+                            continue
                         self.display_manager.print_text(
                         style=f"{BOLD}",
                         text=f"Appointment {appointment['appointment_id']} note has been successfully changed."
@@ -338,13 +382,17 @@ class MHWPController:
 
             try:
                 update_status = "CANCELLED" if new_status == 1 else "CONFIRMED"
-                update_entry(self.appointment_file, appointment["appointment_id"], {"status": update_status})
+                if not self.update_appointment(appointment["appointment_id"], {"status": update_status}):
+                    self.display_manager.print_text(
+                        style=f"{RED}",
+                        text=f"Something went wrong. Unable to change the status of appointment {appointment['appointment_id']}."
+                    )
+                    break
 
                 #send email to patient and mhwp
 
                 status_message = f"{"Confirmed" if new_status == 1 else "Cancelled"}"
-                patients = self.get_patients_info()
-                patient = next((p for p in patients if p["patient_id"] == appointment["patient_id"]), None)
+                patient = self.get_patient(appointment["patient_id"])
                 patient_name = patient["name"]
                 patient_email = patient["email"]
 
@@ -374,7 +422,7 @@ class MHWPController:
 
                 self.display_manager.print_text(
                     style=f"{RESET}{BOLD}",
-                    text=f"📅 Appointment {appointment['appointment_id']} status has been successfully changed to {'CANCELLED' if new_status == 1 else 'CONFIRMED'}.\nEmail updates have been sent"
+                    text=f"📅 Appointment {appointment['appointment_id']} status has been successfully changed to {'CANCELLED' if new_status == 1 else 'CONFIRMED'}.\nEmail updates are on their way"
 
 
                 )
@@ -449,6 +497,22 @@ class MHWPController:
                 return False
          
             
+    def save_resource(self, resource):
+        """
+        Save a resource suggested for an appointment, keyed on (appointment_id, resource_name).
+        Older data files hold an empty placeholder resource per appointment; the first
+        resource suggested for the appointment fills it in instead of being added next to it.
+        Returns True on success.
+        """
+        with file_lock(self.mwhp_resources_file, exclusive=True):
+            appointment_id = resource["appointment_id"]
+            existing = get_position(self.mwhp_resources_file, "appointment_id", appointment_id, resource_name=resource["resource_name"])
+            placeholder = get_position(self.mwhp_resources_file, "appointment_id", appointment_id, resource_name="")
+            if existing is None and placeholder is not None:
+                return update_entry(self.mwhp_resources_file, placeholder, resource)
+            return upsert_entry(self.mwhp_resources_file, resource, ("appointment_id", "resource_name"))
+
+
     def suggest_resources(self):
         """Allow MHWP to suggest resources to patients from a predefined list."""
         self.view_calendar()
@@ -515,25 +579,32 @@ class MHWPController:
 
                         if resource_input == 5:
                             # Manual input resources
-                            manual_name = input(f"{CYAN}{BOLD}Enter the name of the new resource: {RESET}").strip()
-                            manual_link = input(f"{CYAN}{BOLD}Enter the link of the new resource: {RESET}").strip()
-                            
-                            update_entry(self.mwhp_resources_file, app["appointment_id"], {"resource_name": manual_name})
-                            update_entry(self.mwhp_resources_file, app["appointment_id"], {"resource_link": manual_link})
-                            self.display_manager.print_text(
-                                style=f"{GREEN}",
-                                text=f"Resource '{manual_name}' with link '{manual_link}' has been successfully added and assigned."
-                            )
-                            return
+                            resource_name = input(f"{CYAN}{BOLD}Enter the name of the new resource: {RESET}").strip()
+                            resource_link = input(f"{CYAN}{BOLD}Enter the link of the new resource: {RESET}").strip()
                         else:
                             # Allocate pre-defined resources
-                            update_entry(self.mwhp_resources_file, app["appointment_id"], {"resource_name": resources["Resource Name"][resource_input - 1]})
-                            update_entry(self.mwhp_resources_file, app["appointment_id"], {"resource_link": resources["Resource Link"][resource_input - 1]})
+                            resource_name = resources["Resource Name"][resource_input - 1]
+                            resource_link = resources["Resource Link"][resource_input - 1]
+
+                        # An appointment can have several resources; suggesting one again updates its link
+                        resource = {
+                            "appointment_id": app["appointment_id"],
+                            "resource_name": resource_name,
+                            "resource_link": resource_link,
+                            "create_time": datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+                        }
+                        if not self.save_resource(resource):
                             self.display_manager.print_text(
-                                style=f"{GREEN}",
-                                text=f"Resource '{resources['Resource Name'][resource_input - 1]}' has been successfully assigned."
+                                style=f"{RED}",
+                                text="Failed to save the resource. Please try again."
                             )
                             return
+                        if resource_input == 5:
+                            message = f"Resource '{resource_name}' with link '{resource_link}' has been successfully added and assigned."
+                        else:
+                            message = f"Resource '{resource_name}' has been successfully assigned."
+                        self.display_manager.print_text(style=f"{GREEN}", text=message)
+                        return
 
             else:
                 self.display_manager.print_text(
@@ -545,27 +616,18 @@ class MHWPController:
 
     def view_feedback(self):
         """Display feedback given by patients for MHWP's appointments."""
-
-        apps = self.get_appointments()
-        feedbacks = self.get_feedback()
-
-        # Create a mapping for the MHWP's apppointments and corresponding Patient names
-        app_set = {}
-        for app in apps:
-            app_set[app["appointment_id"]] = self.get_patient_name(app["patient_id"])
-
         data = {
             "Appointment ID": [],
             "Patient Name": [],
             "Feedback": []
         }
 
-        # Populate the data structure with feedback from patients
-        for feedback in feedbacks:
-            if feedback["appointment_id"] in app_set:
-                data["Appointment ID"].append(feedback["appointment_id"])
-                data["Patient Name"].append(app_set[feedback["appointment_id"]])
-                data["Feedback"].append(feedback["feedback"])
+        # Populate the data structure with feedback from patients, already joined with the appointments
+        for appointment in self.appointment_details.for_mhwp(self.mhwp.user_id):
+            for feedback in appointment["feedback"]:
+                data["Appointment ID"].append(appointment["appointment_id"])
+                data["Patient Name"].append(appointment["patient_name"])
+                data["Feedback"].append(feedback)
 
         create_table(data, title="📒 Patient Feedback", display_title=True)
 
@@ -576,22 +638,17 @@ class MHWPController:
     def view_dashboard(self):
         """Display patient dashboard for a MHWP."""
         patient_records = self.get_patient_records()
-        patients_info = self.get_patients_info()
-        patient_moods = self.get_patient_mood_data()
-
-        for record in patient_records:
-            for info in patients_info:
-                if record["patient_id"] == info["patient_id"]:
-                    record.update(info)
+        patient_moods = self.get_patient_mood_data(limit=self.dashboard_mood_limit)
 
+        # Join the records with the patient information and the recent moods by patient ID
         for record in patient_records:
-            # 2d array
-            moods = patient_moods[record["patient_id"]]
-            record["moods"] = ""
-            record["mood_comments"] = ""
-            for mood in moods:
-                record["moods"] += " " + self.icons[int(mood[-1][0])]
-                record["mood_comments"] += " " + mood[-2]
+            info = self.get_patient(record["patient_id"])
+            if info:
+                record.update(info)
+            # 2d array, most recent first
+            moods = patient_moods.get(record["patient_id"], [])
+            record["moods"] = "".join(" " + self.icons[int(mood[-1][0])] for mood in moods)
+            record["mood_comments"] = "".join(" " + mood[-2] for mood in moods)
 
         data = {
             "Patient ID": [],
@@ -607,7 +664,7 @@ class MHWPController:
         for patient in patient_records:
             data["Patient ID"].append(patient["patient_id"])
             data["Name"].append(patient["name"])
-            data["Email"].append(patient["name"])
+            data["Email"].append(patient["email"])
             data["Conditions"].append(patient["condition"])
             data["Notes"].append(patient["notes"])
             data["Emergency Contact"].append(patient["emergency_contact_email"])
@@ -686,7 +743,9 @@ class MHWPController:
                         if new_condition not in ['Anxiety', 'ADHD', 'Depression', 'Stress', 'PTSD', 'Bipolar Disorder', 'OCD', 'Panic Disorder', 'Social Anxiety', 'GAD (Generalized Anxiety Disorder)']:
                             print(f"{RED}Invalid choice. Please choose condition from the list. \n{RESET}")
                             continue
-                        update_entry('./data/patient_record.json', id_input, {"condition": new_condition})
+                        if not self.update_record(id_input, {"condition": new_condition}):
+                            print(f"{RED}Patient record could not be updated, please try again.{RESET}")
+                            break
                         print(f"{GREEN}Patient condition updated successfully.{RESET}")
                         break
                     break
@@ -698,7 +757,9 @@ class MHWPController:
                     if new_notes == "back":
                         self.update_patient_record()
                         return
-                    update_entry(self.patient_record_file, id_input, {"notes": new_notes})
+                    if not self.update_record(id_input, {"notes": new_notes}):
+                        print(f"{RED}Patient record could not be updated, please try again.{RESET}")
+                        break
                     print(f"{GREEN}Patient notes updated successfully.{RESET}")
                     break
 
@@ -712,16 +773,25 @@ class MHWPController:
                         if new_condition not in ['Anxiety', 'ADHD', 'Depression', 'Stress', 'PTSD', 'Bipolar Disorder', 'OCD', 'Panic Disorder', 'Social Anxiety', 'GAD (Generalized Anxiety Disorder)']:
                             print(f"{RED}Invalid choice. Please choose condition from the list. \n{RESET}")
                             continue
-                        update_entry('./data/patient_record.json', id_input, {"condition": new_condition})
-                        print(f"{GREEN}Patient condition updated successfully.{RESET}")
                         break                    
 
                     new_notes = input(f"{CYAN}Please enter new notes for the patient: {RESET}")
                     if new_notes == "back":
                         self.update_patient_record()
                         return
-                    update_entry(self.patient_record_file, id_input, {"condition": new_condition})
-                    update_entry(self.patient_record_file, id_input, {"notes": new_notes})
+                    # Write the condition and the notes together
+                    try:
+                        with file_lock(self.patient_record_file, exclusive=True):
+                            position = get_position(self.patient_record_file, "patient_id", id_input)
+                            with batch(self.patient_record_file) as tx:
+                                if position is None or not (tx.update(position, {"condition": new_condition})
+                                                            and tx.update(position, {"notes": new_notes})):
+                                    raise OSError(f"No record of patient {id_input}")
+                    except OSError:
+                        print(f"{RED}Patient record could not be updated, please try again.\n{RESET}")
+                        break
+                    finally:
+                        self.snapshot.discard(self.patient_record_file)
                     print(f"{GREEN}Patient record updated successfully.\n{RESET}")
                     break
 
@@ -783,7 +853,7 @@ class MHWPController:
                     email_body = first_line + "\n" + email_input + "\n" + final_line
                     email_success = send_email(email, subject_input, email_body)
                     if (email_success):
-                        print(f"{GREEN}Email has been sent successfully.{RESET}")
+                        print(f"{GREEN}Email has been queued and will be sent shortly.{RESET}")
                     else:
                         print(f"{RED}Something went wrong. Please try again later...{RESET}")
 
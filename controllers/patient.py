@@ -5,14 +5,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from models.user import Patient
 from utils.data_handler import *
+from utils.appointments import BOOKING_HORIZON_DAYS, get_appointment_details, get_availability, get_calendar
 from utils.display_manager import DisplayManager
-from controllers.mhwp import MHWPController
-from controllers.admin import AdminController
-import urllib.request
-import urllib.parse
-import ssl
-from html.parser import HTMLParser
-import pandas as pd
 from datetime import datetime, timedelta
 from utils.email_helper import send_email
 
@@ -58,6 +52,10 @@ class PatientController:
         self.patient_record_file = 'data/patient_record.json'
         self.mhwp_resources_file = "data/mhwp_resources.json"
         self.skip_upcoming_appointments = False
+        self.booking_horizon_days = BOOKING_HORIZON_DAYS
+        self.appointment_details = get_appointment_details(
+            self.appointment_file, self.patient_info_file, self.mhwp_info_file, self.feedback_file, self.mhwp_resources_file
+        )
 
 
 # ------------------------------------
@@ -65,28 +63,17 @@ class PatientController:
 # ------------------------------------
     def get_upcoming_appointments(self):
         """Get appointments within the next 7 days for the patient."""
-        current_date = datetime.now()
-        seven_days_later = current_date + timedelta(days=7)
-
-        # Read appointment data
-        appointments = read_json(self.appointment_file)
-        if not appointments:
-            return []
-
-        # Read MHWP info to get mhwp_name
-        mhwp_info = read_json(self.mhwp_info_file)
-
-        # Filter appointments within the next 7 days for the current patient
-        upcoming_appointments = []
-        for appointment in appointments:
-            if appointment["patient_id"] == self.patient.user_id:
-                appointment_date = datetime.strptime(appointment["date"], "%Y-%m-%d")
-                if current_date <= appointment_date <= seven_days_later:
-                    # Find the MHWP name based on mhwp_id
-                    mhwp_id = appointment["mhwp_id"]
-                    mhwp_name = next((mhwp["name"] for mhwp in mhwp_info if mhwp["mhwp_id"] == mhwp_id), "Unknown MHWP")
-                    appointment["mhwp_name"] = mhwp_name  # Add mhwp_name to the appointment
-                    upcoming_appointments.append(appointment)
+        today = datetime.now().date()
+
+        # Range read of the patient's appointments from tomorrow to 7 days later
+        upcoming_appointments = get_calendar(self.appointment_file).between(
+            today + timedelta(days=1), today + timedelta(days=7), "patient_id", self.patient.user_id
+        )
+        for appointment in upcoming_appointments:
+            # Find the MHWP name based on mhwp_id
+            mhwp_id = appointment["mhwp_id"]
+            mhwp_name = next((mhwp["name"] for mhwp in get_by(self.mhwp_info_file, "mhwp_id", mhwp_id)), "Unknown MHWP")
+            appointment["mhwp_name"] = mhwp_name  # Add mhwp_name to the appointment
         # Sort upcoming appointments by date and time
         upcoming_appointments.sort(key=lambda x: (x['date'], x['time_slot']))
         return upcoming_appointments
@@ -286,8 +273,8 @@ class PatientController:
 
     def edit_profile(self):
             """Edit the patient's profile information and save changes to JSON file."""
-            patient_info_data = read_json(self.patient_info_file)
-            patient_record_data = read_json(self.patient_record_file)
+            patient_info_data, info_version = read_json_versioned(self.patient_info_file)
+            patient_record_data, record_version = read_json_versioned(self.patient_record_file)
 
             patient_found = False
             for patient in patient_info_data:
@@ -377,9 +364,18 @@ class PatientController:
                         else:
                             print(f"{LIGHT_RED}Invalid choice. Please try again.")
                             
-                        # Save the updated data back to the file
-                        save_json(self.patient_info_file, patient_info_data)
-                        save_json(self.patient_record_file, patient_record_data)
+                        # Save the updated data back to both files together, unless another session changed them meanwhile
+                        try:
+                            with group_commit():
+                                if not (save_json(self.patient_info_file, patient_info_data, expected_version=info_version)
+                                        and save_json(self.patient_record_file, patient_record_data, expected_version=record_version)):
+                                    # Discards whichever of the two saves went through
+                                    raise OSError("profile changed in another session")
+                        except OSError:
+                            print(f"{LIGHT_RED}Your profile was changed in another session. Your changes were not saved, please try again.")
+                            break
+                        _, info_version = read_json_versioned(self.patient_info_file)
+                        _, record_version = read_json_versioned(self.patient_record_file)
             
             if patient_found == False:
                 print(f"{LIGHT_RED}Patient not found. Please try again.")
@@ -388,8 +384,7 @@ class PatientController:
 
     def display_eligible_mhwps(self, patient_id, current_mhwp_id):
         """Display a list of eligible MHWPs (patient_count < 4) for the patient to select from."""
-        
-        AdminController.calculate_patient_counts(self.patient_info_file, self.mhwp_info_file)
+        # patient_count is kept up to date by every allocation, so it is read as is
         mhwp_data = read_json(self.mhwp_info_file)
 
         # Show eligible mhwp
@@ -412,8 +407,7 @@ class PatientController:
                     if 0 <= selected_idx < len(eligible_mhwps):
                         new_mhwp_id = eligible_mhwps[selected_idx]["mhwp_id"]
                         reason = input("Enter the reason for changing MHWP: ").strip()
-                        self.create_mhwp_change_request(patient_id, current_mhwp_id, new_mhwp_id, reason)
-                        return True  # Indicate success
+                        return self.create_mhwp_change_request(patient_id, current_mhwp_id, new_mhwp_id, reason)
                     else:
                         print(f"{LIGHT_RED}Invalid selection. Please select a valid index.{RESET}")
                 except ValueError:
@@ -422,13 +416,6 @@ class PatientController:
 
     def create_mhwp_change_request(self, patient_id, current_mhwp_id, target_mhwp_id, reason):
         """Create a new MHWP change request and save it to request_log.json."""
-        # Ensure request_log is initialized properly
-        request_log = read_json(self.request_log_file)
-        
-        # If read_json returns None, initialize an empty list
-        if request_log is None:
-            request_log = []
-        
         new_request = {
             "patient_id": patient_id,
             "current_mhwp_id": current_mhwp_id,
@@ -438,12 +425,12 @@ class PatientController:
             "requested_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
 
-        # Append the new request
-        request_log.append(new_request)
-
-        # Save the updated request log back to the file
-        save_json(self.request_log_file, request_log)
+        # Append the new request to the request log
+        if not add_entry(self.request_log_file, new_request):
+            print(f"{LIGHT_RED}Failed to submit your request. Please try again.{RESET}")
+            return False
         print("Your request to change MHWP has been submitted and is pending approval.")
+        return True
 
 
 # ----------------------------
@@ -619,24 +606,15 @@ class PatientController:
 
     def view_moods(self):
         """Display all mood logs for the current patient."""
-        moods = read_json(self.mood_file)
-        
-        if not moods:
-            print(f"{LIGHT_RED}No mood entries found.{RESET}")
-            return
-        
-        # Filter for the current patient's mood entries
+        # The current patient's mood entries, latest first, from the per-patient mood index
         patient_moods = [
-            {"index": i, **m} for i, m in enumerate(moods) if m["patient_id"] == self.patient.user_id
+            {"index": i, **m} for i, m in get_latest(self.mood_file, "patient_id", self.patient.user_id, "timestamp")
         ]
 
         if not patient_moods:
             print(f"{LIGHT_RED}No mood entries found for this patient.{RESET}")
             return
         
-        # Sort moods by timestamp in descending order
-        patient_moods.sort(key=lambda x: x["timestamp"], reverse=True)
-        
         # Prepare table data and create an index map
         table_data = {
             "Date": [],
@@ -795,26 +773,24 @@ class PatientController:
     def view_appointment(self, status=None):
         """View appointments for the current patient."""
         try:
-            patient_info = read_json(self.patient_info_file)
-            appointment = read_json(self.appointment_file)
+            # Appointments already joined with their MHWP's name
+            appointment = self.appointment_details.for_patient(self.patient.user_id)
 
-            patient = next((p for p in patient_info if p["patient_id"] == self.patient.user_id), None)
+            patient = next(iter(get_by(self.patient_info_file, "patient_id", self.patient.user_id)), None)
             if not patient:
                 print(f"{LIGHT_RED}Patient not found.{RESET}")
                 return
             
             # Filter appointments for the current patient
             if status:
-                patient_appointments = [a for a in appointment if a["patient_id"] == self.patient.user_id and a["status"] != status]
+                patient_appointments = [a for a in appointment if a["status"] != status]
             else:
-                patient_appointments = [a for a in appointment if a["patient_id"] == self.patient.user_id]
+                patient_appointments = appointment
             if not patient_appointments:
                 print(f"{LIGHT_RED}❌ No appointments found for this patient.{RESET}")
                 return
             
             # Prepare table data
-            mhwp_info = read_json(self.mhwp_info_file)
-            
             table_data = {
                 "Date": [],
                 "Time Slot": [],
@@ -831,11 +807,7 @@ class PatientController:
                 self.appointment_id_map[idx] = appt["appointment_id"]  
                 table_data["Date"].append(appt.get("date", "N/A"))
                 table_data["Time Slot"].append(appt.get("time_slot", "N/A"))
-                mhwp_name = next(
-                    (m["name"] for m in mhwp_info if m["mhwp_id"] == appt.get("mhwp_id")),
-                    "Unknown"
-                )
-                table_data["Your MHWP"].append(mhwp_name)
+                table_data["Your MHWP"].append(appt["mhwp_name"])
                 table_data["Notes"].append(appt.get("notes", ""))
                 table_data["Status"].append(appt.get("status", "Unknown"))
             
@@ -854,42 +826,26 @@ class PatientController:
     def make_appointment(self):
         """Make appointment with MHWP."""
         try:
-            patient_info = read_json(self.patient_info_file)
-            appointment = read_json(self.appointment_file)
-            mhwp_info = read_json(self.mhwp_info_file)
-
-            patient = next((p for p in patient_info if p["patient_id"] == self.patient.user_id), None)
+            patient = next(iter(get_by(self.patient_info_file, "patient_id", self.patient.user_id)), None)
             if not patient:
                 print(f"{LIGHT_RED}Patient not found.{RESET}")
                 return
-                
+
+            availability = get_availability(self.appointment_file)
             today = datetime.now().date()
-            all_dates = [(today + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(1, 8)]
-            all_time_slots = [
-                "09:00 - 10:00", "10:00 - 11:00", "11:00 - 12:00",
-                "14:00 - 15:00", "15:00 - 16:00", "16:00 - 17:00"
-                ]
-            
+            all_dates = [
+                (today + timedelta(days=i)).strftime("%Y-%m-%d")
+                for i in range(1, self.booking_horizon_days + 1)
+            ]
+
             # Display available dates
             while True:
-                available_dates = []
-                for date in all_dates:
-                    # Check if the patient already has an appointment on this date
-                    patient_appointments_on_date = [
-                        a for a in appointment
-                        if a["patient_id"] == self.patient.user_id and a["date"] == date
-                    ]
-                    if patient_appointments_on_date:
-                        continue  # Skip this date as the patient already has an appointment
-
-                    # Check if slots are available for the date
-                    mhwp_appointments = [
-                        a for a in appointment
-                        if a["mhwp_id"] == self.patient.mhwp_id and a["date"] == date and a["status"] in ["PENDING", "CONFIRMED"]
-                    ]
-                    booked_slots = [a["time_slot"] for a in mhwp_appointments]
-                    if len(booked_slots) < len(all_time_slots): # If not all the time slots are booked, add the date as available
-                        available_dates.append(date)
+                # Skip the dates the patient already has an appointment on, and the fully booked ones
+                available_dates = [
+                    date for date in all_dates
+                    if not availability.has_appointment(self.patient.user_id, date)
+                    and availability.free_slots(self.patient.mhwp_id, date)
+                ]
 
                 if not available_dates:
                     print(f"{LIGHT_RED}❌ No available dates for appointment.{RESET}")
@@ -917,13 +873,7 @@ class PatientController:
             
             # Display available time slots
             while True:
-                mhwp_appointments = [a for a in mhwp_appointments if a["mhwp_id"] == self.patient.mhwp_id 
-                                        and a["date"] == selected_date
-                                        and a["status"] in ["PENDING", "CONFIRMED"]
-                                    ]   
-                booked_time_slots = [a["time"] for a in mhwp_appointments]
-                # Check the time slots that are not booked
-                available_time_slots = [t for t in all_time_slots if t not in booked_time_slots]
+                available_time_slots = availability.free_slots(self.patient.mhwp_id, selected_date)
                 print("⏰ Available Time Slots:")
                 for i, slot in enumerate(available_time_slots, 1):
                     print(f"{i}. {slot}")
@@ -944,21 +894,30 @@ class PatientController:
                 except ValueError:
                     print(f"{LIGHT_RED}Invalid selection.{RESET}")
 
-            # Confirm appointment
-            new_appointment = {
-                "appointment_id": len(appointment) + 1,
-                "patient_id": self.patient.user_id,
-                "mhwp_id": self.patient.mhwp_id,
-                "date": selected_date,
-                "time_slot": selected_time_slot,
-                "status": "PENDING",
-                "notes": "",
-                "create_time": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
-                "last_updated": datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-            }
-            
-            # Add and save the new appointment
-            add_entry(self.appointment_file, new_appointment)
+            with file_lock(self.appointment_file, exclusive=True):
+                # Someone else may have booked the slot while the patient was choosing
+                availability = get_availability(self.appointment_file)
+                if selected_time_slot not in availability.free_slots(self.patient.mhwp_id, selected_date):
+                    print(f"{LIGHT_RED}❌ This time slot has just been booked. Please choose another one.{RESET}")
+                    return
+
+                # Confirm appointment
+                new_appointment = {
+                    "appointment_id": availability.next_appointment_id(),
+                    "patient_id": self.patient.user_id,
+                    "mhwp_id": self.patient.mhwp_id,
+                    "date": selected_date,
+                    "time_slot": selected_time_slot,
+                    "status": "PENDING",
+                    "notes": "",
+                    "create_time": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+                    "last_updated": datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+                }
+
+                # Add and save the new appointment
+                if not add_entry(self.appointment_file, new_appointment):
+                    print(f"{LIGHT_RED}❌ Failed to book appointment. Please try again.{RESET}")
+                    return
             print(f"{GREEN}😊 Appointment booked successfully!{RESET}")
             print(f"📅 Date: {selected_date}, ⏰ Time Slot: {selected_time_slot}")
 
@@ -987,29 +946,35 @@ class PatientController:
 
             actual_appointment_id = self.appointment_id_map[display_index]
 
-            appointments = read_json(self.appointment_file)
-            for appointment in appointments:
-                if appointment["appointment_id"] == actual_appointment_id:
-                    appointment["status"] = "CANCELLED"
-                    appointment["last_updated"] = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-                    if save_json(self.appointment_file, appointments):
-                        print(f"{GREEN}✅ Appointment cancelled successfully!{RESET}")
-                        mhwp_info = read_json(self.mhwp_info_file)
-                        mhwp_email = next((m["email"] for m in mhwp_info if m["mhwp_id"] == appointment["mhwp_id"]), None)
-                        subject = "Your Patient Canceled an Appointment"
-                        message_body = f'''
-                            Your Patient Canceled an Appointment.\n
-                            Patient Name: {self.patient.name}\n
-                            Patient ID: {self.patient.user_id}\n
-                            Date: {appointment["date"]}\n
-                            Time Slot: {appointment["time_slot"]}\n
-                            Breeze Mental Health and Wellbeing App
-                        '''
-                        if mhwp_email:
-                            send_email(mhwp_email, subject, message_body)
-                        else:
-                            print(f"{LIGHT_RED}❌ Failed to send email to MHWP. Please try again.{RESET}")
-                        return
+            # Find the appointment through the appointment_id index and update it under one lock,
+            # so that a concurrent insert or delete cannot move it in between
+            cancelled = {"status": "CANCELLED", "last_updated": datetime.now().strftime("%Y-%m-%dT%H:%M:%S")}
+            with file_lock(self.appointment_file, exclusive=True):
+                position = get_position(self.appointment_file, "appointment_id", actual_appointment_id)
+                appointment = next(iter(get_by(self.appointment_file, "appointment_id", actual_appointment_id)), None)
+                # Updating the one entry keeps the availability index up to date without a rebuild
+                updated = (
+                    appointment is not None
+                    and appointment["patient_id"] == self.patient.user_id
+                    and update_entry(self.appointment_file, position, cancelled)
+                )
+            if updated:
+                print(f"{GREEN}✅ Appointment cancelled successfully!{RESET}")
+                mhwp_email = next((m["email"] for m in get_by(self.mhwp_info_file, "mhwp_id", appointment["mhwp_id"])), None)
+                subject = "Your Patient Canceled an Appointment"
+                message_body = f'''
+                    Your Patient Canceled an Appointment.\n
+                    Patient Name: {self.patient.name}\n
+                    Patient ID: {self.patient.user_id}\n
+                    Date: {appointment["date"]}\n
+                    Time Slot: {appointment["time_slot"]}\n
+                    Breeze Mental Health and Wellbeing App
+                '''
+                if mhwp_email:
+                    send_email(mhwp_email, subject, message_body)
+                else:
+                    print(f"{LIGHT_RED}❌ Failed to send email to MHWP. Please try again.{RESET}")
+                return
             print(f"❌ {LIGHT_RED}Failed to cancel appointment. Please try again.")
 
 
@@ -1018,6 +983,11 @@ class PatientController:
 # ----------------------------
     def search_by_keyword(self):
         """Search for meditation and relaxation resources by keyword."""
+        # Imported here rather than at startup, as only this screen needs them
+        import ssl
+        import urllib.request
+        from html.parser import HTMLParser
+
         def parse_results(response_content):
             results = []
             is_target_div = False
@@ -1098,31 +1068,19 @@ class PatientController:
 
     def display_resources_from_MHWP(self):
         """Display resources recommended by the MHWP for the current patient."""
-        resources_data = read_json(self.mhwp_resources_file)
-        patients_data = read_json(self.patient_info_file)
-
-        if resources_data is None or patients_data is None:
-            print(f"{LIGHT_RED}Error loading data files. Please check the file paths and formats.{RESET}")
-            return
-
-        current_patient = next(
-            (patient for patient in patients_data if patient["patient_id"] == self.patient.user_id),
-            None
-        )
-
+        current_patient = next(iter(get_by(self.patient_info_file, "patient_id", self.patient.user_id)), None)
         if not current_patient:
             print(f"{DARK_GREY}No patient information found for the current user.{RESET}")
             return
 
-        patient_resources = [
-            res for res in resources_data if res.get("appointment_id") == current_patient["patient_id"]
-        ]
-
+        # Resources are linked to the patient through their appointments
+        patient_resources = self.appointment_details.resources_for_patient(self.patient.user_id)
         if not patient_resources:
             print(f"{CYAN}{BOLD}No resources have been assigned to you by your MHWP.{RESET}")
             return
 
         data = {
+            "Appointment Date": [res.get("date", "N/A") for res in patient_resources],
             "Resource Name": [res.get("resource_name", "N/A") for res in patient_resources],
             "Resource Link": [res.get("resource_link", "N/A") for res in patient_resources],
             "Created Time": [res.get("create_time", "N/A") for res in patient_resources]
@@ -1220,15 +1178,13 @@ class PatientController:
             print(f"{LIGHT_RED}❌ Failed to read feedback data. Please try again.{RESET}")
             return
 
-        # Update the feedback entry
-        for i in feedback_data:
+        # Update the feedback entry in place, so the appointment details are refreshed incrementally
+        for position, i in enumerate(feedback_data, start=1):
             if i["appointment_id"] == actual_appointment_id:
-                i["feedback"] = new_feedback_content  # Update the matching feedback item
-                i["create_time"] = current_timestamp
-                print(f"{GREEN}✅ Feedback updated successfully!{RESET}")
-                # Save the updated feedback data back to the file
-                save_json(self.feedback_file, feedback_data)
-                return
+                if update_entry(self.feedback_file, position, {"feedback": new_feedback_content, "create_time": current_timestamp}):
+                    print(f"{GREEN}✅ Feedback updated successfully!{RESET}")
+                    return
+                break
 
         print(f"{LIGHT_RED}❌ Failed to update feedback. Please try again.{RESET}")
 
@@ -1270,15 +1226,13 @@ class PatientController:
             print(f"{LIGHT_RED}❌ Failed to read feedback data. Please try again.{RESET}")
             return
 
-        # Update the feedback entry
-        for i in feedback_data:
+        # Update the feedback entry in place, so the appointment details are refreshed incrementally
+        for position, i in enumerate(feedback_data, start=1):
             if i["appointment_id"] == actual_appointment_id:
-                i["feedback"] = new_feedback_content  # Update the matching feedback item
-                i["create_time"] = current_timestamp
-                print(f"{GREEN}✅ Feedback updated successfully!{RESET}")
-                # Save the updated feedback data back to the file
-                save_json(self.feedback_file, feedback_data)
-                return
+                if update_entry(self.feedback_file, position, {"feedback": new_feedback_content, "create_time": current_timestamp}):
+                    print(f"{GREEN}✅ Feedback updated successfully!{RESET}")
+                    return
+                break
 
         print(f"{LIGHT_RED}❌ Failed to update feedback. Please try again.{RESET}")
 
@@ -1286,18 +1240,16 @@ class PatientController:
     def view_feedback(self):
         """Vide feedbacks for the appointments."""
         try:
-            patient_info = read_json(self.patient_info_file)
-            appointment = read_json(self.appointment_file)
-            mhwp_info = read_json(self.mhwp_info_file)
-            feedback_info = read_json(self.feedback_file)
-
-            patient = next((p for p in patient_info if p["patient_id"] == self.patient.user_id), None)
+            patient = next(iter(get_by(self.patient_info_file, "patient_id", self.patient.user_id)), None)
             if not patient:
                 print(f"{LIGHT_RED}Patient not found.{RESET}")
                 return
             
-            # Filter appointments for the current patient
-            patient_appointments = [a for a in appointment if a["patient_id"] == self.patient.user_id and a["status"] == "CONFIRMED"]
+            # Confirmed appointments of the current patient, already joined with their MHWP's name and feedback
+            patient_appointments = [
+                appt for appt in self.appointment_details.for_patient(self.patient.user_id)
+                if appt.get("status") == "CONFIRMED"
+            ]
             if not patient_appointments:
                 print("No appointments found for this patient.")
                 return
@@ -1319,17 +1271,9 @@ class PatientController:
                 self.appointment_id_map[idx] = appt["appointment_id"]  
                 table_data["Date"].append(appt.get("date", "N/A"))
                 table_data["Time Slot"].append(appt.get("time_slot", "N/A"))
-                mhwp_name = next(
-                    (m["name"] for m in mhwp_info if m["mhwp_id"] == appt.get("mhwp_id")),
-                    "Unknown"
-                )
-                table_data["Your MHWP"].append(mhwp_name)
+                table_data["Your MHWP"].append(appt["mhwp_name"])
                 table_data["Notes"].append(appt.get("notes", ""))
-                feedback = next(
-                    (f["feedback"] for f in feedback_info if f["appointment_id"] == appt.get("appointment_id")),
-                    "N/A"
-                )
-                table_data["Your Feedback"].append(feedback)
+                table_data["Your Feedback"].append(appt["feedback"][0] if appt["feedback"] else "N/A")
             
             # Display the table
             create_table(
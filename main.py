@@ -1,12 +1,10 @@
 import sys
 import logging
 import time
-from controllers.admin import AdminController
-from controllers.mhwp import MHWPController
-from controllers.patient import PatientController
 from models.user import Admin, MHWP, Patient
 from utils.data_handler import *
 from utils.display_manager import *
+from utils.email_helper import resume_outbox
 
 
 """
@@ -40,11 +38,13 @@ def log_action(action, user):
     logging.info(f"Action: {action}, Performed by: {user}")
 
 def display_welcome_page():
-    display_manager.print_divider(line="=", length=70, style=f"{BOLD}")
-    display_manager.print_centered_message(message="🍃 Breeze Mental Health Management System 🍃", style=f"{GREEN}{BOLD}")
-    display_manager.print_centered_message(message="✨ Your journey to better mental health starts here! ✨", style=f"{MAGENTA}")
-    display_manager.print_divider(line="=", length=70, style=f"{BOLD}")
-    print(f"{CYAN}Please log in to continue.{CYAN}{RESET}")
+    display_manager.write_block([
+        display_manager.format_divider(line="=", length=70, style=f"{BOLD}"),
+        display_manager.format_centered_message(message="🍃 Breeze Mental Health Management System 🍃", style=f"{GREEN}{BOLD}"),
+        display_manager.format_centered_message(message="✨ Your journey to better mental health starts here! ✨", style=f"{MAGENTA}"),
+        display_manager.format_divider(line="=", length=70, style=f"{BOLD}"),
+        f"{CYAN}Please log in to continue.{CYAN}{RESET}",
+    ])
 
 def reset_inactivity_timer():
     global last_activity_time
@@ -59,26 +59,20 @@ def check_inactivity():
 
 def get_user_info_by_userid(user_id, filepath):
     """Retrieve basic user information by user_id from user.json."""
-    user_data = read_json(filepath)
-    
-    for user in user_data:
-        # Check if the user_id matches
-        if 'user_id' in user and int(user['user_id']) == user_id:
-            return user  # Return the user dictionary if found
+    # Look the user up in the user_id index of the file
+    for user in get_by(filepath, 'user_id', user_id):
+        return user  # Return the user dictionary if found
     
     print(f"No user found with user id '{user_id}' in {filepath}.")
     return None
 
 def get_role_specific_info(user_id, role, filepath):
     """Retrieve role-specific information by user_id from role-specific files."""
-    user_data = read_json(filepath)
-    
     # Determine the correct key for user_id based on the role
     user_id_key = 'patient_id' if role == 'patient' else 'mhwp_id' if role == 'mhwp' else 'user_id'
     
-    for user in user_data:
-        if user_id_key in user and int(user[user_id_key]) == user_id:
-            return user  # Return the role-specific user dictionary if found
+    for user in get_by(filepath, user_id_key, user_id):
+        return user  # Return the role-specific user dictionary if found
     
     print(f"No {role} data found for user id '{user_id}' in {filepath}.")
     return None
@@ -151,7 +145,9 @@ def role_navigation(user_role, user_id):
         print("User information not found.")
         return
 
+    # Only the controller of the logged-in role is imported
     if user_role == 'admin':
+        from controllers.admin import AdminController
         admin_user = Admin(
             user_id=user_info['user_id'],
             username=user_info['username'],
@@ -165,6 +161,7 @@ def role_navigation(user_role, user_id):
             print(f"{RED}Error: Admin controller does not have a display_menu method.{RESET}")
 
     elif user_role == 'patient':
+        from controllers.patient import PatientController
         patient_info = get_role_specific_info(user_id, 'patient', './data/patient_info.json')
         if patient_info:
             patient_user = Patient(
@@ -186,6 +183,7 @@ def role_navigation(user_role, user_id):
             print("Patient-specific information not found.")
 
     elif user_role == 'mhwp':
+        from controllers.mhwp import MHWPController
         mhwp_info = get_role_specific_info(user_id, 'mhwp', './data/mhwp_info.json')
         if mhwp_info:
             mhwp_user = MHWP(
@@ -211,6 +209,8 @@ def role_navigation(user_role, user_id):
 
 
 def main():
+    # Deliver the emails a previous session left in the outbox
+    resume_outbox()
     while True:
         display_welcome_page()
         user_role, user_id = login()
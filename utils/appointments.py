@@ -0,0 +1,445 @@
+import bisect
+import os
+from datetime import datetime
+from functools import lru_cache
+from utils.data_handler import get_view
+from utils.indexes import DataView, HashIndex
+
+
+# Time slots an MHWP can be booked for each day, in display order
+ALL_TIME_SLOTS = [
+    "09:00 - 10:00", "10:00 - 11:00", "11:00 - 12:00",
+    "14:00 - 15:00", "15:00 - 16:00", "16:00 - 17:00"
+]
+
+# Appointments with these statuses occupy their time slot
+ACTIVE_STATUSES = {"PENDING", "CONFIRMED"}
+
+# Number of days ahead (from tomorrow) patients can book appointments for
+BOOKING_HORIZON_DAYS = 7
+
+_SLOT_BITS = {slot: 1 << i for i, slot in enumerate(ALL_TIME_SLOTS)}
+
+
+class AvailabilityIndex(DataView):
+    """
+    Booked time slots of the appointment file, as one bitmask of ALL_TIME_SLOTS
+    per (mhwp_id, date), plus the dates on which each patient has an active
+    appointment and the highest appointment_id. It is kept up to date by
+    add_entry / update_entry / delete_entry (see utils.data_handler.get_view),
+    so finding free slots does not depend on the number of past appointments.
+    """
+
+    def __init__(self):
+        self._entries = []        # every appointment, in file order
+        self._slot_counts = {}    # (mhwp_id, date, slot bit) -> number of active appointments in the slot
+        self._masks = {}          # (mhwp_id, date) -> bitmask of the slots with active appointments
+        self._patient_dates = {}  # (patient_id, date) -> number of active appointments
+        self._id_counts = {}      # appointment_id -> number of appointments with that id
+        self._max_id = 0
+
+    def rebuild(self, entries):
+        self.__init__()
+        for position, entry in enumerate(entries):
+            self.on_add(position, entry)
+
+    def _count(self, entry, change):
+        """
+        Adds (change=1) or removes (change=-1) an appointment's contribution to the index.
+        """
+        appointment_id = entry.get("appointment_id")
+        if isinstance(appointment_id, int):
+            count = self._id_counts.get(appointment_id, 0) + change
+            if count:
+                self._id_counts[appointment_id] = count
+            else:
+                del self._id_counts[appointment_id]
+            if change > 0:
+                self._max_id = max(self._max_id, appointment_id)
+            elif appointment_id == self._max_id and not count:
+                self._max_id = max(self._id_counts, default=0)
+
+        if entry.get("status") not in ACTIVE_STATUSES:
+            return
+        date = entry.get("date")
+        patient_key = (entry.get("patient_id"), date)
+        patient_count = self._patient_dates.get(patient_key, 0) + change
+        if patient_count:
+            self._patient_dates[patient_key] = patient_count
+        else:
+            self._patient_dates.pop(patient_key, None)
+
+        bit = _SLOT_BITS.get(entry.get("time_slot"))
+        if bit is None:
+            return
+        slot_key = (entry.get("mhwp_id"), date, bit)
+        slot_count = self._slot_counts.get(slot_key, 0) + change
+        day_key = (entry.get("mhwp_id"), date)
+        if slot_count:
+            self._slot_counts[slot_key] = slot_count
+            self._masks[day_key] = self._masks.get(day_key, 0) | bit
+        else:
+            self._slot_counts.pop(slot_key, None)
+            mask = self._masks.get(day_key, 0) & ~bit
+            if mask:
+                self._masks[day_key] = mask
+            else:
+                self._masks.pop(day_key, None)
+
+    def on_add(self, position, entry):
+        self._entries.append(entry)
+        self._count(entry, 1)
+
+    def on_update(self, position, old_entry, new_entry):
+        self._count(self._entries[position], -1)
+        self._entries[position] = new_entry
+        self._count(new_entry, 1)
+
+    def on_delete(self, position, entry):
+        self._count(self._entries.pop(position), -1)
+
+    def booked_mask(self, mhwp_id, date):
+        """Returns the bitmask of ALL_TIME_SLOTS booked with an MHWP on a date ("YYYY-MM-DD")."""
+        return self._masks.get((mhwp_id, date), 0)
+
+    def free_slots(self, mhwp_id, date):
+        """Returns the time slots still free with an MHWP on a date, in ALL_TIME_SLOTS order."""
+        mask = self.booked_mask(mhwp_id, date)
+        return [slot for slot in ALL_TIME_SLOTS if not mask & _SLOT_BITS[slot]]
+
+    def has_appointment(self, patient_id, date):
+        """Returns True if the patient has a pending or confirmed appointment on a date."""
+        return (patient_id, date) in self._patient_dates
+
+    def next_appointment_id(self):
+        """Returns an appointment_id no appointment uses yet."""
+        return self._max_id + 1
+
+
+@lru_cache(maxsize=4096)
+def _day_ordinal(date):
+    """Returns the ordinal of a "YYYY-MM-DD" date, or None if it is not a valid date."""
+    try:
+        return datetime.strptime(date, "%Y-%m-%d").toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+class AppointmentCalendar(DataView):
+    """
+    Appointments of the appointment file by date, for range reads such as the
+    next 7 days, plus the number of appointments per ISO week, status and
+    MHWP. Dates are parsed once, when an appointment enters the calendar, and
+    both structures are kept up to date by add_entry / update_entry / delete_entry.
+    """
+
+    def __init__(self):
+        self._rows = []       # [day ordinal, entry] for every appointment, in file order
+        self._days = []       # sorted ordinals of the days that have appointments
+        self._day_rows = {}   # day ordinal -> rows of the appointments on that day
+        self._undated = []    # rows whose date is missing or invalid
+        self._weeks = {}      # (ISO year, ISO week) -> status -> mhwp_id -> number of appointments
+
+    def rebuild(self, entries):
+        self.__init__()
+        for position, entry in enumerate(entries):
+            self.on_add(position, entry)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _week_counts(self, day, status):
+        iso_year, iso_week, _ = datetime.fromordinal(day).isocalendar()
+        return self._weeks.setdefault((iso_year, iso_week), {}).setdefault(status, {})
+
+    def _insert(self, row):
+        day = row[0]
+        if day is None:
+            self._undated.append(row)
+            return
+        day_rows = self._day_rows.get(day)
+        if day_rows is None:
+            day_rows = self._day_rows[day] = []
+            bisect.insort(self._days, day)
+        day_rows.append(row)
+        counts = self._week_counts(day, row[1].get("status"))
+        mhwp_id = row[1].get("mhwp_id", "N/A")
+        counts[mhwp_id] = counts.get(mhwp_id, 0) + 1
+
+    def _remove(self, row):
+        day = row[0]
+        if day is None:
+            self._undated.remove(row)
+            return
+        day_rows = self._day_rows[day]
+        # Rows are compared by identity: two appointments may have equal entries
+        del day_rows[next(i for i, r in enumerate(day_rows) if r is row)]
+        if not day_rows:
+            del self._day_rows[day]
+            del self._days[bisect.bisect_left(self._days, day)]
+        counts = self._week_counts(day, row[1].get("status"))
+        mhwp_id = row[1].get("mhwp_id", "N/A")
+        counts[mhwp_id] -= 1
+        if not counts[mhwp_id]:
+            del counts[mhwp_id]
+
+    def on_add(self, position, entry):
+        row = [_day_ordinal(entry.get("date")), entry]
+        self._rows.append(row)
+        self._insert(row)
+
+    def on_update(self, position, old_entry, new_entry):
+        self._remove(self._rows[position])
+        row = self._rows[position] = [_day_ordinal(new_entry.get("date")), new_entry]
+        self._insert(row)
+
+    def on_delete(self, position, entry):
+        self._remove(self._rows.pop(position))
+
+    def between(self, start, end, key=None, value=None):
+        """
+        Returns copies of the appointments dated from start to end (dates, both
+        included), in date order, keeping only those whose key equals value if key is given.
+        """
+        start, end = start.toordinal(), end.toordinal()
+        first = bisect.bisect_left(self._days, start)
+        last = bisect.bisect_right(self._days, end)
+        return [
+            dict(entry)
+            for day in self._days[first:last]
+            for _, entry in self._day_rows[day]
+            if key is None or entry.get(key) == value
+        ]
+
+    def weekly_counts(self, day, status):
+        """
+        Returns {mhwp_id: number of appointments} for the appointments with a
+        status in the ISO week (Monday to Sunday) of day, a date.
+        """
+        iso_year, iso_week, _ = day.isocalendar()
+        return dict(self._weeks.get((iso_year, iso_week), {}).get(status, {}))
+
+    def undated(self):
+        """Returns copies of the appointments whose date is missing or not a valid "YYYY-MM-DD" date."""
+        return [dict(entry) for _, entry in self._undated]
+
+
+def get_availability(appointment_file):
+    """
+    Returns the AvailabilityIndex of an appointment file, rebuilt only when
+    the file was changed other than through the data handler functions.
+    """
+    return get_view(appointment_file, "availability", AvailabilityIndex)
+
+
+def get_calendar(appointment_file):
+    """
+    Returns the AppointmentCalendar of an appointment file, rebuilt only when
+    the file was changed other than through the data handler functions.
+    """
+    return get_view(appointment_file, "calendar", AppointmentCalendar)
+
+
+class _JoinIndex(HashIndex):
+    """
+    Hash index over one of the files joined into AppointmentDetails, telling
+    the details which key values changed after each write (None after a rebuild).
+    """
+
+    def __init__(self, key, on_change):
+        super().__init__(key)
+        self._on_change = on_change
+        self._loading = False
+
+    def rebuild(self, entries):
+        self._loading = True
+        try:
+            super().rebuild(entries)
+        finally:
+            self._loading = False
+        self._on_change(self, None)
+
+    def on_add(self, position, entry):
+        super().on_add(position, entry)
+        if not self._loading:
+            self._on_change(self, [entry.get(self.key)])
+
+    def on_update(self, position, old_entry, new_entry):
+        old_value = self._rows[position][1].get(self.key)
+        super().on_update(position, old_entry, new_entry)
+        self._on_change(self, [old_value, new_entry.get(self.key)])
+
+    def on_delete(self, position, entry):
+        old_value = self._rows[position][1].get(self.key)
+        super().on_delete(position, entry)
+        self._on_change(self, [old_value])
+
+    def first(self, value, field, default=None):
+        """Returns field of the first entry whose key equals value, or default."""
+        entries = self.get(value)
+        return entries[0][1].get(field, default) if entries else default
+
+
+class _AppointmentRows(DataView):
+    """
+    Rows [position, appointment] of the appointment file, each materialized
+    by AppointmentDetails as it is added, updated or deleted.
+    """
+
+    def __init__(self, details):
+        self._details = details
+        self._rows = []
+
+    def rebuild(self, entries):
+        self._details._clear()
+        self._rows = []
+        for position, entry in enumerate(entries):
+            self.on_add(position, entry)
+
+    def on_add(self, position, entry):
+        row = [position, entry]
+        self._rows.append(row)
+        self._details._materialize(row)
+
+    def on_update(self, position, old_entry, new_entry):
+        row = self._rows[position]
+        self._details._forget(row)
+        row[1] = new_entry
+        self._details._materialize(row)
+
+    def on_delete(self, position, entry):
+        row = self._rows.pop(position)
+        self._details._forget(row)
+        # Appointments after the deleted one move up by one position
+        for later_row in self._rows[position:]:
+            later_row[0] -= 1
+
+
+class AppointmentDetails:
+    """
+    Materialized join of every appointment with its patient's name, its
+    MHWP's name, its feedback and the resources suggested for it.
+
+    Each source file has a view (see utils.data_handler.get_view) that updates
+    only the details it affects after add_entry / update_entry / delete_entry:
+    a new feedback refreshes one appointment, a renamed MHWP the appointments
+    of that MHWP. A source changed any other way is rebuilt by refresh(),
+    which every query calls first.
+    """
+
+    def __init__(self, appointment_file, patient_info_file, mhwp_info_file, feedback_file, resources_file):
+        self.appointment_file = appointment_file
+        self.patient_info_file = patient_info_file
+        self.mhwp_info_file = mhwp_info_file
+        self.feedback_file = feedback_file
+        self.resources_file = resources_file
+        self._patients = self._mhwps = self._feedback = self._resources = None
+        self._clear()
+
+    def _clear(self):
+        self._details = {}          # id(appointment row) -> [row, detail]
+        self._by_patient = {}       # patient_id -> {id(row): [row, detail]}
+        self._by_mhwp = {}          # mhwp_id -> {id(row): [row, detail]}
+        self._by_appointment = {}   # appointment_id -> {id(row): [row, detail]}
+
+    def refresh(self):
+        """Brings the details up to date with every source file."""
+        # The joined files first, so that rebuilt appointments are joined with current data
+        name = ("details", id(self))
+        get_view(self.patient_info_file, name, lambda: _JoinIndex("patient_id", self._patients_changed))
+        get_view(self.mhwp_info_file, name, lambda: _JoinIndex("mhwp_id", self._mhwps_changed))
+        get_view(self.feedback_file, name, lambda: _JoinIndex("appointment_id", self._feedback_changed))
+        get_view(self.resources_file, name, lambda: _JoinIndex("appointment_id", self._resources_changed))
+        get_view(self.appointment_file, name, lambda: _AppointmentRows(self))
+
+    def _join(self, detail, *fields):
+        appointment_id = detail.get("appointment_id")
+        if "patient_name" in fields and self._patients is not None:
+            detail["patient_name"] = self._patients.first(detail.get("patient_id"), "name", "Unknown")
+        if "mhwp_name" in fields and self._mhwps is not None:
+            detail["mhwp_name"] = self._mhwps.first(detail.get("mhwp_id"), "name", "Unknown")
+        if "feedback" in fields and self._feedback is not None:
+            detail["feedback"] = [f.get("feedback") for _, f in self._feedback.get(appointment_id)]
+        if "resources" in fields and self._resources is not None:
+            detail["resources"] = [dict(r) for _, r in self._resources.get(appointment_id)]
+
+    def _materialize(self, row):
+        detail = dict(row[1], patient_name="Unknown", mhwp_name="Unknown", feedback=[], resources=[])
+        self._join(detail, "patient_name", "mhwp_name", "feedback", "resources")
+        pair = [row, detail]
+        self._details[id(row)] = pair
+        for partition, key in ((self._by_patient, "patient_id"), (self._by_mhwp, "mhwp_id"), (self._by_appointment, "appointment_id")):
+            partition.setdefault(detail.get(key), {})[id(row)] = pair
+
+    def _forget(self, row):
+        _, detail = self._details.pop(id(row))
+        for partition, key in ((self._by_patient, "patient_id"), (self._by_mhwp, "mhwp_id"), (self._by_appointment, "appointment_id")):
+            partition[detail.get(key)].pop(id(row), None)
+
+    def _rejoin(self, partition, values, field):
+        """Refreshes one joined field of the details whose partition key is in values (all if None)."""
+        if values is None:
+            pairs = self._details.values()
+        else:
+            pairs = [pair for value in set(values) for pair in partition.get(value, {}).values()]
+        for _, detail in pairs:
+            self._join(detail, field)
+
+    def _patients_changed(self, index, values):
+        self._patients = index
+        self._rejoin(self._by_patient, values, "patient_name")
+
+    def _mhwps_changed(self, index, values):
+        self._mhwps = index
+        self._rejoin(self._by_mhwp, values, "mhwp_name")
+
+    def _feedback_changed(self, index, values):
+        self._feedback = index
+        self._rejoin(self._by_appointment, values, "feedback")
+
+    def _resources_changed(self, index, values):
+        self._resources = index
+        self._rejoin(self._by_appointment, values, "resources")
+
+    def _select(self, pairs):
+        pairs = sorted(pairs, key=lambda pair: pair[0][0])
+        return [dict(detail, feedback=list(detail["feedback"]), resources=[dict(r) for r in detail["resources"]]) for _, detail in pairs]
+
+    def for_patient(self, patient_id):
+        """Returns copies of the details of a patient's appointments, in file order."""
+        self.refresh()
+        return self._select(self._by_patient.get(patient_id, {}).values())
+
+    def for_mhwp(self, mhwp_id):
+        """Returns copies of the details of an MHWP's appointments, in file order."""
+        self.refresh()
+        return self._select(self._by_mhwp.get(mhwp_id, {}).values())
+
+    def resources_for_patient(self, patient_id):
+        """
+        Returns the resources suggested for a patient's appointments, in file
+        order, each with the appointment's date and MHWP name. Only the
+        patient's own appointments are looked at.
+        """
+        return [
+            dict(resource, date=detail.get("date"), mhwp_name=detail["mhwp_name"])
+            for detail in self.for_patient(patient_id)
+            for resource in detail["resources"]
+            if resource.get("resource_name")
+        ]
+
+
+_appointment_details = {}
+
+
+def get_appointment_details(appointment_file, patient_info_file, mhwp_info_file, feedback_file, resources_file):
+    """
+    Returns the AppointmentDetails joining these files, shared by every
+    controller that uses the same files.
+    """
+    files = (appointment_file, patient_info_file, mhwp_info_file, feedback_file, resources_file)
+    key = tuple(os.path.abspath(f) for f in files)
+    details = _appointment_details.get(key)
+    if details is None:
+        details = _appointment_details[key] = AppointmentDetails(*files)
+    return details
@@ -0,0 +1,156 @@
+"""
+Cascading deletes across the data files.
+
+The foreign keys between the files are declared once in FOREIGN_KEYS. Deleting
+an entry (e.g. a user) deletes every entry that refers to it, directly or
+through other entries (the patient's appointments, then the feedback and
+resources of those appointments), unless a restricting foreign key still
+refers to it, in which case nothing is deleted. Entries referring to it
+through a kept foreign key stay as they are, with its id.
+"""
+import os
+from collections import deque
+from utils.data_handler import get_view, group_commit, read_json, save_json
+from utils.indexes import HashIndex
+
+
+CASCADE = "cascade"
+RESTRICT = "restrict"
+KEEP = "keep"
+
+USER_FILE = "data/user.json"
+PATIENT_INFO_FILE = "data/patient_info.json"
+MHWP_INFO_FILE = "data/mhwp_info.json"
+MHWP_FILE = "data/mhwp.json"
+APPOINTMENT_FILE = "data/appointment.json"
+JOURNAL_FILE = "data/patient_journal.json"
+MOOD_FILE = "data/patient_mood.json"
+PATIENT_RECORD_FILE = "data/patient_record.json"
+REQUEST_LOG_FILE = "data/request_log.json"
+FEEDBACK_FILE = "data/feedback.json"
+RESOURCES_FILE = "data/mhwp_resources.json"
+
+# (child file, child key, parent file, parent key, on delete of the parent)
+FOREIGN_KEYS = [
+    (PATIENT_INFO_FILE, "patient_id", USER_FILE, "user_id", CASCADE),
+    (MHWP_INFO_FILE, "mhwp_id", USER_FILE, "user_id", CASCADE),
+    (MHWP_FILE, "mhwp_id", USER_FILE, "user_id", CASCADE),
+    (PATIENT_RECORD_FILE, "patient_id", PATIENT_INFO_FILE, "patient_id", CASCADE),
+    (JOURNAL_FILE, "patient_id", PATIENT_INFO_FILE, "patient_id", CASCADE),
+    (MOOD_FILE, "patient_id", PATIENT_INFO_FILE, "patient_id", CASCADE),
+    (APPOINTMENT_FILE, "patient_id", PATIENT_INFO_FILE, "patient_id", CASCADE),
+    (REQUEST_LOG_FILE, "patient_id", PATIENT_INFO_FILE, "patient_id", CASCADE),
+    # Other patients' appointment history and request log outlive a deleted MHWP
+    (APPOINTMENT_FILE, "mhwp_id", MHWP_INFO_FILE, "mhwp_id", KEEP),
+    (REQUEST_LOG_FILE, "current_mhwp_id", MHWP_INFO_FILE, "mhwp_id", KEEP),
+    (REQUEST_LOG_FILE, "target_mhwp_id", MHWP_INFO_FILE, "mhwp_id", KEEP),
+    (PATIENT_INFO_FILE, "mhwp_id", MHWP_INFO_FILE, "mhwp_id", RESTRICT),
+    (FEEDBACK_FILE, "appointment_id", APPOINTMENT_FILE, "appointment_id", CASCADE),
+    (RESOURCES_FILE, "appointment_id", APPOINTMENT_FILE, "appointment_id", CASCADE),
+]
+
+
+def _lookup(filepath, key, value):
+    """Returns (position, entry) pairs of the entries whose key equals value, from the hash index."""
+    return get_view(filepath, ("hash", key), lambda: HashIndex(key)).get(value)
+
+
+def plan_delete(filepath, key, value, foreign_keys=FOREIGN_KEYS):
+    """
+    Computes what deleting the entries of filepath whose key equals value
+    involves, without changing anything. Every referring entry is found
+    through the hash indexes, so the cost depends on the number of affected
+    entries rather than the size of the files.
+    Returns ({file: set of 0-based positions to delete}, [(file, key, value)
+    of the restricting references that block the delete]).
+    """
+    paths = {os.path.abspath(f): f for fk in foreign_keys for f in (fk[0], fk[2])}
+    paths.setdefault(os.path.abspath(filepath), filepath)
+
+    doomed = {}
+    restrictions = []
+    seen = set()
+    queue = deque([(os.path.abspath(filepath), key, value)])
+    while queue:
+        path, k, v = queue.popleft()
+        if (path, k, v) in seen:
+            continue
+        seen.add((path, k, v))
+
+        positions = doomed.setdefault(path, set())
+        deleted = [(p, e) for p, e in _lookup(paths[path], k, v) if p not in positions]
+        positions.update(p for p, _ in deleted)
+
+        for child, child_key, parent, parent_key, on_delete in foreign_keys:
+            if on_delete == KEEP or os.path.abspath(parent) != path:
+                continue
+            for _, entry in deleted:
+                reference = (os.path.abspath(child), child_key, entry.get(parent_key))
+                if on_delete == RESTRICT:
+                    restrictions.append(reference)
+                else:
+                    queue.append(reference)
+
+    # A restricting reference only blocks if the referring entries are not deleted too
+    blocked = [
+        (paths[child], child_key, parent_value)
+        for child, child_key, parent_value in dict.fromkeys(restrictions)
+        if any(p not in doomed.get(child, ()) for p, _ in _lookup(paths[child], child_key, parent_value))
+    ]
+    return {paths[path]: positions for path, positions in doomed.items() if positions}, blocked
+
+
+def _delete_order(foreign_keys):
+    """
+    Returns the files of the foreign keys with every child before its parents,
+    so that a delete interrupted half-way leaves unreferenced entries, never orphans.
+    """
+    children = {}
+    for child, _, parent, _, _ in foreign_keys:
+        children.setdefault(os.path.abspath(parent), []).append(os.path.abspath(child))
+
+    order = []
+    visited = set()
+
+    def visit(path):
+        if path in visited:
+            return
+        visited.add(path)
+        for child in children.get(path, []):
+            visit(child)
+        order.append(path)
+
+    for fk in foreign_keys:
+        visit(os.path.abspath(fk[2]))
+    return order
+
+
+def cascade_delete(filepath, key, value, foreign_keys=FOREIGN_KEYS):
+    """
+    Deletes the entries of filepath whose key equals value and every entry
+    that refers to them, e.g. cascade_delete("data/user.json", "user_id", 3).
+    All the deletes are one group commit: each affected file is rewritten once,
+    children before parents. It joins the caller's group_commit if there is one.
+    Returns {file: number of deleted entries}, or None if a restricting foreign
+    key blocks the delete, in which case nothing is deleted.
+    Raises OSError if the deletes cannot be saved. If a write fails part way
+    through the flush, the files written before it stay saved; they are the
+    children of the others, so no entry is left referring to a deleted one.
+    """
+    with group_commit():
+        plan, blocked = plan_delete(filepath, key, value, foreign_keys)
+        if blocked:
+            return None
+
+        planned = {os.path.abspath(f): (f, positions) for f, positions in plan.items()}
+        order = _delete_order(foreign_keys) + [os.path.abspath(filepath)]
+        deleted = {}
+        for path in dict.fromkeys(order):
+            if path not in planned:
+                continue
+            file, positions = planned[path]
+            data = read_json(file)
+            if not save_json(file, [entry for i, entry in enumerate(data) if i not in positions]):
+                raise OSError(f"Failed to save {file}")
+            deleted[file] = len(positions)
+    return deleted
@@ -1,7 +1,17 @@
-import pandas as pd
 import json
-import re
+import os
+import copy
+from collections import OrderedDict
+from contextlib import contextmanager, ExitStack
 from utils.display_manager import DisplayManager
+from utils.storage_backend import StorageBackend
+from utils.indexes import DataView, HashIndex, SortedIndex
+from utils.text_width import display_width, center
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where sessions are not locked against each other
+    fcntl = None
 
 BOLD = "\033[1m"
 UNDERLINE = "\033[4m"
@@ -16,119 +26,1026 @@ LIGHT_YELLOW = "\033[93m"
 ITALIC = "\033[3m"
 ORANGE = "\033[1;33m"  
 
-def read_json(filepath):
+# Memory budget (approximated by file size on disk) for parsed JSON files kept in memory
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Log-like data files stored as JSON Lines (one compact entry per line) so that
+# add_entry can append a single line instead of rewriting the whole file.
+# Files still stored as a JSON array are migrated on their first append or save.
+JSON_LINES_FILES = {"patient_mood.json", "patient_journal.json", "request_log.json", "feedback.json"}
+
+# Parsed JSON files in least-recently-used order: abspath -> (version, size, data)
+_json_cache = OrderedDict()
+_json_cache_bytes = 0
+
+
+def _snapshot(data):
     """
-    Reads a JSON file and returns its content.
+    Returns a copy of cached data that the caller is free to mutate.
+    Entries in our data files are flat dictionaries, so copying each
+    dictionary is enough and much cheaper than a deep copy.
     """
-    try:
-        with open(filepath, 'r') as file:
-            return json.load(file) 
-    except FileNotFoundError as e:
-        print(f"File not found: {e}")
-        return None
-    except json.JSONDecodeError as e:
-        print(f"Invalid JSON format in file: {filepath} - {e}")
+    if isinstance(data, list):
+        return [dict(entry) if isinstance(entry, dict) else copy.deepcopy(entry) for entry in data]
+    return copy.deepcopy(data)
+
+
+def _stat_version(stat):
+    """
+    Identifies one state of a file on disk. Atomic saves replace the inode and
+    appends grow the size, so our own writes always produce a new version.
+    """
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _cache_get(path, stat):
+    """
+    Returns the cached data for path if the file has not changed since it was cached, else None.
+    """
+    cached = _json_cache.get(path)
+    if cached is None:
         return None
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    version, _, data = cached
+    if version != _stat_version(stat):
+        _cache_discard(path)
         return None
-    
+    _json_cache.move_to_end(path)
+    return data
+
+
+def _cache_put(path, stat, data):
+    """
+    Stores parsed data for path and evicts the least recently used files
+    until the cache fits in CACHE_MAX_BYTES.
+    """
+    global _json_cache_bytes
+    _cache_discard(path)
+    if stat.st_size > CACHE_MAX_BYTES:
+        return
+    _json_cache[path] = (_stat_version(stat), stat.st_size, data)
+    _json_cache_bytes += stat.st_size
+    while _json_cache_bytes > CACHE_MAX_BYTES and _json_cache:
+        _, (_, evicted_size, _) = _json_cache.popitem(last=False)
+        _json_cache_bytes -= evicted_size
+
+
+def _cache_discard(path):
+    """
+    Removes path from the cache if present.
+    """
+    global _json_cache_bytes
+    cached = _json_cache.pop(path, None)
+    if cached is not None:
+        _json_cache_bytes -= cached[1]
+
+
+def set_cache_budget(max_bytes):
+    """
+    Changes the memory budget of the JSON cache and evicts files that no longer fit.
+    A budget of 0 disables caching.
+    """
+    global CACHE_MAX_BYTES, _json_cache_bytes
+    CACHE_MAX_BYTES = max_bytes
+    while _json_cache_bytes > CACHE_MAX_BYTES and _json_cache:
+        _, (_, evicted_size, _) = _json_cache.popitem(last=False)
+        _json_cache_bytes -= evicted_size
+
+
+def clear_cache():
+    """
+    Drops every cached JSON file.
+    """
+    global _json_cache_bytes
+    _json_cache.clear()
+    _json_cache_bytes = 0
+
+
+def is_json_lines_file(filepath):
+    """
+    Returns True if the file is one of the log-like collections stored as JSON Lines.
+    """
+    return os.path.basename(filepath) in JSON_LINES_FILES
+
+
+def _stored_as_array(file):
+    """
+    Returns True if an open file holds a JSON array rather than JSON Lines.
+    The file position is reset to the start.
+    """
+    char = file.read(1)
+    while char and char.isspace():
+        char = file.read(1)
+    file.seek(0)
+    return char == "["
+
+
+def _iter_json_lines(file):
+    """
+    Yields the entries of an open JSON Lines file. A last line without a
+    newline that does not parse, cut off by a crash or still being appended
+    by another session, is skipped; any other invalid line raises JSONDecodeError.
+    """
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            # Only the last line of a file can lack its newline
+            if line.endswith("\n"):
+                raise
+
+
+def _load_json(file, path):
+    """
+    Parses an open data file, streaming it line by line if it is stored as JSON Lines.
+    """
+    if is_json_lines_file(path) and not _stored_as_array(file):
+        return list(_iter_json_lines(file))
+    return json.load(file)
+
+
+def _dump_json(file, path, data):
+    """
+    Writes data to an open file in the storage format used for path.
+    """
+    if is_json_lines_file(path) and isinstance(data, list):
+        file.writelines(json.dumps(entry) + "\n" for entry in data)
+    else:
+        json.dump(data, file, indent=4)
+
+
+# Number of characters read at a time when streaming a JSON array
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Characters that can continue a JSON number
+_NUMBER_CHARS = set("0123456789+-.eE")
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _iter_json_array(file):
+    """
+    Yields the elements of the top-level JSON array in an open file one at a
+    time, decoding them with JSONDecoder.raw_decode from a buffer that only
+    ever holds the current chunk and the unfinished element.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    expecting = "["
+    while True:
+        # Skip whitespace, reading more of the file when the buffer runs out
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            chunk = file.read(STREAM_CHUNK_SIZE)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+        if pos >= len(buffer):
+            raise json.JSONDecodeError("Unexpected end of file", buffer, pos)
+
+        char = buffer[pos]
+        if expecting == "[":
+            if char != "[":
+                raise json.JSONDecodeError("Expecting '['", buffer, pos)
+            pos, expecting = pos + 1, "value or ]"
+        elif char == "]" and expecting != "value":
+            return
+        elif expecting == ", or ]":
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+            pos, expecting = pos + 1, "value"
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                if not eof and (end == len(buffer) or _is_number(value) and set(buffer[end:]) <= _NUMBER_CHARS):
+                    # A number at the end of the buffer may continue in the next chunk,
+                    # e.g. "-150" of "-150.5e3" when the chunk ends before or inside ".5e3"
+                    raise json.JSONDecodeError("Value may be incomplete", buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = file.read(STREAM_CHUNK_SIZE)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+            yield value
+            pos, expecting = end, ", or ]"
+
 
-def save_json(filepath, data):
+def migrate_to_json_lines(filepath):
     """
-    Writes data to a JSON file.
+    Rewrites a log-like data file stored as a JSON array as JSON Lines.
+    Returns True if the file is (now) stored as JSON Lines.
     """
+    if not is_json_lines_file(filepath):
+        print(f"{filepath} is not stored as JSON Lines.")
+        return False
     try:
-        with open(filepath, 'w') as file:
-            json.dump(data, file, indent=4)
+        with open(filepath, 'r') as file:
+            if not _stored_as_array(file):
+                return True
+    except FileNotFoundError:
         return True
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        return False
-    except json.JSONDecodeError as e:
-        print(f"Invalid JSON format in file: {filepath} - {e}")
-        return False
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    backend = JSONBackend()
+    data = backend.read(filepath)
+    if not isinstance(data, list):
         return False
+    return backend.save(filepath, data)
 
 
-def add_entry(filepath, entry):
+def _repair_last_line(path):
+    """
+    Makes a JSON Lines file end in a newline before an entry is appended to it,
+    so that the entry does not get joined to a last line left unfinished by a
+    crash. An unfinished line that does not parse is cut off; a complete entry
+    that only lacks its newline gets one. The caller holds the exclusive file lock.
+    """
+    with open(path, 'rb+') as file:
+        size = file.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        file.seek(size - 1)
+        if file.read(1) == b"\n":
+            return
+        # Find the start of the last line, reading backwards a block at a time
+        start = size
+        while start > 0:
+            block_start = max(0, start - STREAM_CHUNK_SIZE)
+            file.seek(block_start)
+            newline = file.read(start - block_start).rfind(b"\n")
+            if newline != -1:
+                start = block_start + newline + 1
+                break
+            start = block_start
+        file.seek(start)
+        try:
+            json.loads(file.read().decode("utf-8"))
+            file.write(b"\n")
+        except ValueError:
+            file.truncate(start)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _atomic_write(path, data, sync_directory=True):
     """
-    Adds a new entry to a JSON file
+    Writes data to a temporary file next to path, flushes it to disk and
+    swaps it into place with os.replace, so a crash or Ctrl-C leaves either
+    the old or the new file behind but never a truncated one.
     """
-    data = read_json(filepath)
+    # tempfile pulls in shutil and random, which the read-only screens never need
+    import tempfile
+
+    directory = os.path.dirname(path)
     try:
-        if isinstance(data, list):
-            data.append(entry)
-            return save_json(filepath, data)
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        return False
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        # mkstemp creates the file readable by its owner only; keep the permissions of the file it replaces
+        os.chmod(temp_path, mode)
+        with os.fdopen(fd, 'w') as file:
+            _dump_json(file, path, data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if sync_directory:
+        _fsync_directory(directory)
 
 
-def delete_entry(filepath, index):
+def _fsync_directory(directory):
     """
-    Deletes an entry from a JSON file based on the index of the entry
+    Flushes a directory entry so that a rename inside it survives a crash (no-op where unsupported).
     """
-    data = read_json(filepath)
-    
     try:
-        if isinstance(data, list):
-            if 1 <= index <= len(data):
-                del data[index-1]
-                return save_json(filepath, data)
-            else:
-                print(f"Invalid index: {index}")
-                return False
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        return False
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
 
 
-def update_entry(filepath, index, new_entry):
+# Locks this process holds: lock file path -> [file descriptor, exclusive, depth]
+_held_locks = {}
+
+
+@contextmanager
+def file_lock(filepath, exclusive=False):
     """
-    Updates an entry in a JSON file based on a key value pair
+    Holds a cross-process lock on a data file for the duration of the block.
+    Shared locks let any number of sessions read the file at once; an exclusive
+    lock waits for them and keeps everyone else out until the block exits.
+    The lock is taken on a sidecar "<file>.lock", because saves replace the
+    data file itself. Nested calls for the same file reuse the outer lock,
+    which must then be exclusive if the inner one is.
     """
-    data = read_json(filepath)
+    if fcntl is None:
+        yield
+        return
+    lock_path = os.path.abspath(filepath) + ".lock"
+    held = _held_locks.get(lock_path)
+    if held is not None:
+        if exclusive and not held[1]:
+            raise RuntimeError(f"Cannot take an exclusive lock on {filepath} while holding a shared one")
+        held[2] += 1
+        try:
+            yield
+        finally:
+            held[2] -= 1
+        return
+
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
     try:
-        if isinstance(data, list):
-            if 1 <= index <= len(data):
-                data[index-1].update(new_entry)
-                return save_json(filepath, data)
-            else:
-                print(f"Invalid index: {index}")
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        _held_locks[lock_path] = [fd, exclusive, 1]
+        try:
+            yield
+        finally:
+            del _held_locks[lock_path]
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+class JSONBackend(StorageBackend):
+    """
+    Default storage backend: one JSON (or JSON Lines) file per collection,
+    with parsed files kept in the in-memory cache above.
+    Inside a group commit, saves are held in memory and written once per file when the group ends.
+
+    Reads hold a shared file_lock and read-modify-write operations an
+    exclusive one, only while they touch the file, so concurrent sessions
+    on one data directory neither block each other for long nor lose writes.
+    """
+
+    def __init__(self):
+        self._group_depth = 0
+        self._pending = {}
+        self._group_versions = {}   # path -> version of the file the group's changes are based on
+
+    def begin_group(self):
+        self._group_depth += 1
+
+    def end_group(self, commit=True):
+        self._group_depth -= 1
+        if self._group_depth > 0:
+            return True
+        pending, self._pending = self._pending, {}
+        versions, self._group_versions = self._group_versions, {}
+        if not commit:
+            return True
+        success = True
+        directories = set()
+        with ExitStack() as locks:
+            # Sorted, so that two sessions flushing the same files cannot deadlock
+            for path in sorted(pending):
+                locks.enter_context(file_lock(path, exclusive=True))
+            for path in pending:
+                if path in versions and self.version(path) != versions[path]:
+                    print(f"{path} was changed by another session. The changes made to it were not saved.")
+                    return False
+            for path, data in pending.items():
+                try:
+                    _atomic_write(path, data, sync_directory=False)
+                    _cache_put(path, os.stat(path), data)
+                    directories.add(os.path.dirname(path))
+                except Exception as e:
+                    # Stop here, so that the files are still written in the order they were saved in
+                    print(f"An unexpected error occurred while saving {path}: {e}")
+                    success = False
+                    break
+        for directory in directories:
+            _fsync_directory(directory)
+        return success
+
+    def version(self, filepath):
+        try:
+            return _stat_version(os.stat(filepath))
+        except OSError:
+            return None
+
+    def entry_at(self, filepath, index):
+        path = os.path.abspath(filepath)
+        data = self._pending.get(path)
+        if data is None:
+            try:
+                data = _cache_get(path, os.stat(path))
+            except OSError:
+                return None
+        if data is None:
+            data = self.read(filepath)
+        if isinstance(data, list) and 1 <= index <= len(data):
+            return dict(data[index-1])
+        return None
+
+    def read(self, filepath):
+        try:
+            path = os.path.abspath(filepath)
+            if path in self._pending:
+                return _snapshot(self._pending[path])
+            with file_lock(path):
+                stat = os.stat(path)
+                if self._group_depth > 0:
+                    self._group_versions.setdefault(path, _stat_version(stat))
+                data = _cache_get(path, stat)
+                if data is None:
+                    with open(path, 'r') as file:
+                        data = _load_json(file, path)
+                    _cache_put(path, stat, data)
+            return _snapshot(data)
+        except FileNotFoundError as e:
+            print(f"File not found: {e}")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"Invalid JSON format in file: {filepath} - {e}")
+            return None
+        except Exception as e:
+            print(f"An unexpected error occurred: {e}")
+            return None
+
+    def read_versioned(self, filepath):
+        path = os.path.abspath(filepath)
+        with file_lock(path):
+            if path in self._pending:
+                return self.read(path), self._group_versions.get(path)
+            return self.read(path), self.version(path)
+
+    def iter_entries(self, filepath, predicate=None):
+        """
+        Serves entries from pending writes or the cache when possible; otherwise
+        streams the file without parsing it into memory as a whole.
+        Streaming does not lock the file: saves replace it with a new file,
+        and a JSON Lines entry still being appended by another session is
+        skipped until its line is complete.
+        """
+        try:
+            path = os.path.abspath(filepath)
+            data = self._pending.get(path)
+            if data is None:
+                data = _cache_get(path, os.stat(path))
+            if data is not None:
+                entries = (dict(entry) if isinstance(entry, dict) else entry for entry in data)
+                yield from (entry for entry in entries if predicate is None or predicate(entry))
+                return
+            with open(path, 'r') as file:
+                if is_json_lines_file(path) and not _stored_as_array(file):
+                    entries = _iter_json_lines(file)
+                else:
+                    entries = _iter_json_array(file)
+                yield from (entry for entry in entries if predicate is None or predicate(entry))
+        except FileNotFoundError as e:
+            print(f"File not found: {e}")
+        except json.JSONDecodeError as e:
+            print(f"Invalid JSON format in file: {filepath} - {e}")
+
+    def save(self, filepath, data, expected_version=None):
+        try:
+            path = os.path.abspath(filepath)
+            with file_lock(path, exclusive=True):
+                if expected_version is not None:
+                    base_version = self._group_versions.get(path) if path in self._pending else self.version(path)
+                    if base_version != expected_version:
+                        print(f"{filepath} was changed by another session since it was read.")
+                        return False
+                if self._group_depth > 0:
+                    if expected_version is not None:
+                        self._group_versions.setdefault(path, expected_version)
+                    self._pending[path] = _snapshot(data)
+                    return True
+                _atomic_write(path, data)
+                _cache_put(path, os.stat(path), _snapshot(data))
+            return True
+        except Exception as e:
+            print(f"An unexpected error occurred: {e}")
+            return False
+
+    def add(self, filepath, entry):
+        if is_json_lines_file(filepath) and self._group_depth == 0:
+            return self._append_line(filepath, entry)
+
+        with file_lock(filepath, exclusive=True):
+            data = self.read(filepath)
+            try:
+                if isinstance(data, list):
+                    data.append(entry)
+                    return self.save(filepath, data)
+            except Exception as e:
+                print(f"An unexpected error occurred: {e}")
                 return False
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        return False
+
+    def _append_line(self, filepath, entry):
+        """
+        Appends an entry to a JSON Lines file with a single write.
+        """
+        try:
+            path = os.path.abspath(filepath)
+            with file_lock(path, exclusive=True):
+                if not migrate_to_json_lines(filepath):
+                    return False
+                cached = None
+                if os.path.exists(path):
+                    cached = _cache_get(path, os.stat(path))
+                    _repair_last_line(path)
+                with open(path, 'a') as file:
+                    file.write(json.dumps(entry) + "\n")
+                    file.flush()
+                    os.fsync(file.fileno())
+                if cached is not None:
+                    cached.append(dict(entry))
+                    _cache_put(path, os.stat(path), cached)
+            return True
+        except Exception as e:
+            print(f"An unexpected error occurred: {e}")
+            return False
+
+    def delete(self, filepath, index):
+        with file_lock(filepath, exclusive=True):
+            data = self.read(filepath)
+            try:
+                if isinstance(data, list):
+                    if 1 <= index <= len(data):
+                        del data[index-1]
+                        return self.save(filepath, data)
+                    else:
+                        print(f"Invalid index: {index}")
+                        return False
+            except Exception as e:
+                print(f"An unexpected error occurred: {e}")
+                return False
+
+    def update(self, filepath, index, new_entry):
+        with file_lock(filepath, exclusive=True):
+            data = self.read(filepath)
+            try:
+                if isinstance(data, list):
+                    if 1 <= index <= len(data):
+                        data[index-1].update(new_entry)
+                        return self.save(filepath, data)
+                    else:
+                        print(f"Invalid index: {index}")
+                        return False
+            except Exception as e:
+                print(f"An unexpected error occurred: {e}")
+                return False
+
+
+def _create_default_backend():
+    """
+    Returns the backend selected by the BREEZE_STORAGE environment variable
+    ("json" by default, or "sqlite").
+    """
+    if os.environ.get("BREEZE_STORAGE", "json").lower() == "sqlite":
+        from utils.sqlite_backend import SQLiteBackend
+        return SQLiteBackend()
+    return JSONBackend()
+
+
+_backend = _create_default_backend()
+
+
+def get_backend():
+    """
+    Returns the storage backend currently used by the data handler functions.
+    """
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Replaces the storage backend used by the data handler functions.
+    """
+    global _backend
+    _backend = backend
+
+
+# Views derived from data files (see utils/indexes.py): abspath -> {name: [view, file version]}
+_views = {}
+
+
+def iter_json(filepath, predicate=None):
+    """
+    Yields the entries of a data file one at a time, skipping those for which
+    predicate(entry) is false. Unlike read_json, a file that is not already
+    cached is streamed, so memory use does not grow with the file size:
+
+        for appointment in iter_json(appointment_file, lambda a: a["status"] == "CONFIRMED"):
+            ...
+    """
+    return _backend.iter_entries(filepath, predicate)
+
+
+def get_view(filepath, name, factory):
+    """
+    Returns the view called name over a data file, building it with factory()
+    the first time and rebuilding it only when the file has changed other than
+    through this module's functions (e.g. another session saved it).
+    """
+    path = os.path.abspath(filepath)
+    version = _backend.version(filepath)
+    slots = _views.setdefault(path, {})
+    slot = slots.get(name)
+    if slot is None or version is None or slot[1] != version:
+        view = factory()
+        view.rebuild(_backend.read(filepath) or [])
+        slot = slots[name] = [view, version]
+    return slot[0]
+
+
+def _views_of(filepath):
+    return _views.get(os.path.abspath(filepath))
+
+
+def _update_views(filepath, before, event, *args):
+    """
+    Applies a successful write to the views of a file that were up to date
+    before it, and drops the others so that they are rebuilt on next use.
+    """
+    slots = _views_of(filepath)
+    if not slots:
+        return
+    after = _backend.version(filepath)
+    for name, slot in list(slots.items()):
+        view, version = slot
+        if before is not None and version == before:
+            getattr(view, event)(*args)
+            slot[1] = after
+        else:
+            del slots[name]
+
+
+def read_json(filepath):
+    """
+    Reads a data file and returns its content.
+    """
+    return _backend.read(filepath)
     
 
-def create_title(title, df, col_widths):
+def read_json_versioned(filepath):
+    """
+    Reads a data file and returns (data, version), for edits that take a while
+    (e.g. wait for user input) before saving the data back with
+    save_json(filepath, data, expected_version=version).
+    """
+    return _backend.read_versioned(filepath)
+
+
+def save_json(filepath, data, expected_version=None):
+    """
+    Writes data to a data file.
+    If expected_version is given, nothing is written and False is returned when
+    the file has changed since read_json_versioned returned that version,
+    so that one session does not overwrite another session's changes.
+    """
+    success = _backend.save(filepath, data, expected_version)
+    _views.pop(os.path.abspath(filepath), None)
+    return success
+
+
+def add_entry(filepath, entry):
+    """
+    Adds a new entry to a data file.
+    Entries of JSON Lines files are appended without reading or rewriting the file.
+    """
+    if not _views_of(filepath):
+        return _backend.add(filepath, entry)
+
+    # Locked throughout, so that no other session's write falls between the version and the write
+    with file_lock(filepath, exclusive=True):
+        before = _backend.version(filepath)
+        position = len(get_view(filepath, "_positions", _PositionCounter))
+        success = _backend.add(filepath, entry)
+        if success:
+            _update_views(filepath, before, "on_add", position, dict(entry))
+        return success
+
+
+def delete_entry(filepath, index):
+    """
+    Deletes an entry from a data file based on the index of the entry
+    """
+    if not _views_of(filepath):
+        return _backend.delete(filepath, index)
+
+    with file_lock(filepath, exclusive=True):
+        before = _backend.version(filepath)
+        old_entry = _backend.entry_at(filepath, index)
+        success = _backend.delete(filepath, index)
+        if success:
+            _update_views(filepath, before, "on_delete", index - 1, old_entry)
+        return success
+
+
+def update_entry(filepath, index, new_entry):
+    """
+    Updates an entry in a data file based on a key value pair
+    """
+    if not _views_of(filepath):
+        return _backend.update(filepath, index, new_entry)
+
+    with file_lock(filepath, exclusive=True):
+        before = _backend.version(filepath)
+        old_entry = _backend.entry_at(filepath, index)
+        success = _backend.update(filepath, index, new_entry)
+        if success:
+            _update_views(filepath, before, "on_update", index - 1, old_entry, {**old_entry, **new_entry})
+        return success
+
+
+class _PositionCounter(DataView):
+    """
+    Tracks the number of entries in a data file, i.e. the position of the next added entry.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def rebuild(self, entries):
+        self.count = len(entries)
+
+    def on_add(self, position, entry):
+        self.count += 1
+
+    def on_update(self, position, old_entry, new_entry):
+        pass
+
+    def on_delete(self, position, entry):
+        self.count -= 1
+
+
+def get_by(filepath, key, value):
+    """
+    Returns the entries of a data file whose key equals value, e.g.
+    get_by("data/mhwp_info.json", "mhwp_id", 21).
+    Lookups are served from a hash index over the file, built on first use
+    and kept up to date by add_entry, update_entry and delete_entry.
+    """
+    index = get_view(filepath, ("hash", key), lambda: HashIndex(key))
+    return [dict(entry) for _, entry in index.get(value)]
+
+
+def get_position(filepath, key, value, **criteria):
+    """
+    Returns the 1-based position (as taken by update_entry and delete_entry) of
+    the first entry of a data file whose key equals value, and whose fields
+    equal any further keyword arguments, or None if there is none, e.g.
+    get_position("data/appointment.json", "appointment_id", 49).
+    Ids are not positions once entries have been deleted. Hold the file lock
+    of filepath from the lookup to the write, so the position stays valid.
+    """
+    index = get_view(filepath, ("hash", key), lambda: HashIndex(key))
+    return next(
+        (position + 1 for position, entry in index.get(value) if all(entry.get(k) == v for k, v in criteria.items())),
+        None
+    )
+
+
+def increment_field(filepath, key, value, field, amount, minimum=None):
+    """
+    Adds amount to a numeric field of the entries whose key equals value, e.g.
+    increment_field("data/mhwp_info.json", "mhwp_id", 21, "patient_count", 1).
+    The entries are found through the hash index and updated with update_entry
+    under the file lock, so the cost does not depend on the size of the file
+    and concurrent increments are not lost. The new value is never below minimum.
+    Returns False if an entry could not be saved.
+    """
+    with file_lock(filepath, exclusive=True):
+        index = get_view(filepath, ("hash", key), lambda: HashIndex(key))
+        for position, entry in index.get(value):
+            new_value = (entry.get(field) or 0) + amount
+            if minimum is not None:
+                new_value = max(minimum, new_value)
+            if not update_entry(filepath, position + 1, {field: new_value}):
+                return False
+        return True
+
+
+def upsert_entry(filepath, entry, keys):
+    """
+    Updates the entry of a data file whose fields named in keys equal those of
+    entry, or adds entry if there is none, e.g.
+    upsert_entry("data/mhwp_resources.json", resource, ("appointment_id", "resource_name")).
+    The match is looked up through the hash index on the first key, under the
+    file lock so that two sessions cannot both add the same entry.
+    """
+    with file_lock(filepath, exclusive=True):
+        index = get_view(filepath, ("hash", keys[0]), lambda: HashIndex(keys[0]))
+        for position, existing in index.get(entry.get(keys[0])):
+            if all(existing.get(key) == entry.get(key) for key in keys[1:]):
+                return update_entry(filepath, position + 1, entry)
+        return add_entry(filepath, entry)
+
+
+def get_latest(filepath, key, value, order_by, limit=None):
+    """
+    Returns (position, entry) pairs for the entries of a data file whose key
+    equals value, the latest order_by value first and at most limit of them, e.g.
+    get_latest("data/patient_mood.json", "patient_id", 3, "timestamp", limit=5).
+    Positions are 0-based positions in the file (add 1 for update_entry and delete_entry).
+    Served from an index kept sorted per value, so the cost depends on the
+    number of matching entries rather than the size of the file.
+    """
+    index = get_view(filepath, ("sorted", key, order_by), lambda: SortedIndex(key, order_by))
+    return [(position, dict(entry)) for position, entry in index.latest(value, limit)]
+
+
+@contextmanager
+def group_commit():
+    """
+    Groups the writes made inside the block, e.g. the several saves of one user action:
+
+        with group_commit():
+            save_json(request_log_file, requests)
+            update_entry(patient_info_file, patient_id, {"mhwp_id": new_mhwp_id})
+
+    Reads inside the block see the pending writes. When the block exits they
+    are made durable together, with one atomic write per file however many
+    times it was saved. If the block raises, the pending writes are discarded.
+    Raises OSError if they could not be saved, e.g. another session changed
+    one of the files meanwhile or a write failed.
+    """
+    _backend.begin_group()
+    try:
+        yield
+    except BaseException:
+        _backend.end_group(commit=False)
+        _views.clear()
+        raise
+    committed = _backend.end_group(commit=True)
+    # Views built inside the group saw writes that were not on disk yet
+    _views.clear()
+    if not committed:
+        raise OSError("The changes could not be saved")
+
+
+class Batch:
+    """
+    In-memory copy of a data file that batch() writes back once.
+    Its methods mirror add_entry, update_entry and delete_entry, including
+    the 1-based indexes, and each one applies to the result of the previous ones.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.changed = False
+
+    def add(self, entry):
+        self.entries.append(entry)
+        self.changed = True
+        return True
+
+    def update(self, index, new_entry):
+        if not 1 <= index <= len(self.entries):
+            print(f"Invalid index: {index}")
+            return False
+        self.entries[index-1].update(new_entry)
+        self.changed = True
+        return True
+
+    def delete(self, index):
+        if not 1 <= index <= len(self.entries):
+            print(f"Invalid index: {index}")
+            return False
+        del self.entries[index-1]
+        self.changed = True
+        return True
+
+
+@contextmanager
+def batch(filepath):
+    """
+    Reads a data file once, lets the block apply any number of changes to it
+    and writes it once when the block exits:
+
+        with batch(resources_file) as tx:
+            tx.update(index, {"resource_name": name})
+            tx.update(index, {"resource_link": link})
+
+    If the block raises, nothing is written.
+    """
+    entries, version = read_json_versioned(filepath)
+    if not isinstance(entries, list):
+        raise OSError(f"Could not read entries from {filepath}")
+    tx = Batch(entries)
+    yield tx
+    if tx.changed and not save_json(filepath, tx.entries, expected_version=version):
+        raise OSError(f"Could not save changes to {filepath}")
+
+
+class Snapshot:
+    """
+    Data loaded at most once during one user action, e.g. the dict of
+    patient names that a screen looks up for every appointment it lists:
+
+        names = snapshot.get("patient_names", load_patient_names, patient_info_file)
+
+    Values are shared between the callers of get, which must not modify them.
+    After writing a data file, discard() the values that were built from it.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._sources = {}   # name -> absolute paths of the files the value was built from
+
+    def get(self, name, loader, *sources):
+        """
+        Returns the value called name, calling loader() to build it the first time.
+        sources are the data files it is built from.
+        """
+        if name not in self._values:
+            self._values[name] = loader()
+            self._sources[name] = {os.path.abspath(source) for source in sources}
+        return self._values[name]
+
+    def discard(self, filepath):
+        """
+        Drops the values built from a data file, so that they are loaded again on next use.
+        """
+        path = os.path.abspath(filepath)
+        for name, sources in list(self._sources.items()):
+            if path in sources:
+                del self._values[name]
+                del self._sources[name]
+
+
+def find_entries(filepath, **criteria):
+    """
+    Returns the entries of a data file matching every keyword argument, e.g.
+    find_entries("data/appointment.json", mhwp_id=21, status="PENDING").
+    The filter is pushed down to the storage backend when it can filter
+    natively; otherwise the first criterion is answered from a hash index.
+    """
+    if _backend.filters_natively or not criteria:
+        return _backend.query(filepath, criteria)
+    (key, value), *others = criteria.items()
+    return [entry for entry in get_by(filepath, key, value) if all(entry.get(k) == v for k, v in others)]
+
+
+def _title_lines(title, total_width):
+    dash_lines = "-" * total_width
+    return [dash_lines, dash_lines, center(title, total_width), dash_lines, dash_lines]
+
+
+def create_title(title, col_widths):
     """
     Create a title for the table we print such that
     it covers the entire length of the table and the title is
-    centered
+    centered. col_widths is the list of the widths of the table's columns.
     """
-
     # calculate the width of the current table including separators
-    total_width = sum(col_widths.values()) + 3 * (len(df.columns)-1)
+    total_width = sum(col_widths) + 3 * (len(col_widths)-1)
+    DisplayManager.write_block(_title_lines(title, total_width))
+
+
+def _format_cells(columns, data, start=0, stop=None, col_widths=None):
+    """
+    Converts rows start:stop of every column to strings and widens col_widths
+    (initially the header widths) to fit their display width.
+    Returns the list of string cells of each column and the column widths.
+    """
+    if col_widths is None:
+        col_widths = [display_width(col) for col in columns]
+    cells = []
+    for i, col in enumerate(columns):
+        values = [str(val) for val in data[col][start:stop]]
+        cells.append(values)
+        col_widths[i] = max(col_widths[i], max(map(display_width, values), default=0))
+    return cells, col_widths
+
 
-    # center title
-    title = title.center(total_width, " ")
+def _table_lines(columns, cells, col_widths, title=None):
+    if title is not None:
+        yield from _title_lines(title, sum(col_widths) + 3 * (len(col_widths)-1))
+    yield " | ".join(center(col, width) for col, width in zip(columns, col_widths))
+    yield "=+=".join("=" * width for width in col_widths)
+    for row in zip(*cells):
+        yield " | ".join(center(value, width) for value, width in zip(row, col_widths))
 
-    # print dashes and lines
-    dash_lines = "".join(["-" for _ in range(total_width)])
-    print(dash_lines)
-    print(dash_lines)
-    print(title)
-    print(dash_lines)
-    print(dash_lines)
 
+# Rows per page of paged tables, and rows sampled to size their columns
+TABLE_PAGE_SIZE = 20
+TABLE_WIDTH_SAMPLE = 200
 
-def create_table(data, title="", no_data_message="No data found", display_title=False, display_index=False):
+
+def create_table(data, title="", no_data_message="No data found", display_title=False, display_index=False, page_size=None):
     """
-    Creates and prints a standardized dataframe using pandas
+    Creates and prints a standardized table
     Input data must be of type dictionary with 
     Key: String
     Value: List of any type
@@ -141,70 +1058,64 @@ def create_table(data, title="", no_data_message="No data found", display_title=
             "Emergency Contact": [em_person4@mail.com, em_person3@mail.com, em_person2@mail.com] 
             }
 
-    WARNINGGGGG!!!!!!!!!
-    All lists within the dictionary must be of same length due 
-    to how pandas operates internally. This should be fine for our usecases.
+    All lists within the dictionary should be of the same length,
+    rows are cut to the shortest one.
+    If page_size is given and there are more rows than that, the table is
+    shown one page at a time (see _page_table).
     """
 
     #check if data is empty
-    for key in data:
-        if (len(data[key]) > 0): continue
+    if not data or any(len(values) == 0 for values in data.values()):
         display_manager = DisplayManager()
-        display_manager.print_divider(line="=", length=70, style=f"{BOLD}")
-        display_manager.print_centered_message(message=no_data_message, style=f"{GREEN}{BOLD}")
-        display_manager.print_divider(line="=", length=70, style=f"{BOLD}")
+        display_manager.write_block([
+            display_manager.format_divider(line="=", length=70, style=f"{BOLD}"),
+            display_manager.format_centered_message(message=no_data_message, style=f"{GREEN}{BOLD}"),
+            display_manager.format_divider(line="=", length=70, style=f"{BOLD}"),
+        ])
         return
 
+    row_count = min(len(values) for values in data.values())
     if display_index:
-        data = {"Index": list(range(1, len(next(iter(data.values()))) + 1)), **data}
-        
-    # create pandas dataframe and convert its values to strings
-    df = pd.DataFrame(data=data).astype(str)
-
-    # calculate max_width for each col based on length of each val (headers and data)
-    col_widths = {}
-    for col in df.columns:
-        # Strip ANSI color codes when calculating string lengths
-        clean_values = [re.sub(r'\033\[[0-9;]*m', '', str(val)) for val in df[col]]
-        clean_header = re.sub(r'\033\[[0-9;]*m', '', str(col))
-        
-        # Add extra width for columns containing emojis
-        if col == "Mood":
-            # Add 1 extra space for each emoji in the string
-            emoji_padding = 1
-            clean_values = [val + " " * emoji_padding if "😊" in val or "😕" in val or "😐" in val or 
-                          "🙂" in val or "😃" in val or "😢" in val else val for val in clean_values]
-        
-        col_widths[col] = max(max(len(val) for val in clean_values), len(clean_header))
-
-    # center align the values in each cell
-    for col, width in col_widths.items():
-        if col == "Mood":
-            # For the Mood column, we need to handle ANSI codes differently
-            def center_with_ansi(text, width):
-                # Strip ANSI codes for length calculation
-                clean_text = re.sub(r'\033\[[0-9;]*m', '', text)
-                padding = width - len(clean_text)
-                left_padding = padding // 2
-                right_padding = padding - left_padding
-                return " " * left_padding + text + " " * right_padding
-            
-            df[col] = df[col].apply(lambda x: center_with_ansi(x, width))
-        else:
-            df[col] = df[col].str.center(width)
+        data = {"Index": range(1, row_count + 1), **data}
+    columns = list(data)
+
+    if page_size and row_count > page_size:
+        _page_table(columns, data, row_count, title if display_title else None, page_size)
+        return
 
-    #print title
-    if display_title:
-        create_title(title, df, col_widths)
+    cells, col_widths = _format_cells(columns, data)
+    DisplayManager.write_block(_table_lines(columns, cells, col_widths, title if display_title else None))
 
-    # print headers separately
-    headers = [col.center(col_widths[col]) for col in df.columns]
-    print(" | ".join(headers))
-    print("=+=".join("=" * col_widths[col] for col in df.columns))
 
-    # now print row data (the first parameter is index if needed)
-    for _, row in df.iterrows():
-        print(" | ".join(row))
+def _page_table(columns, data, row_count, title, page_size):
+    """
+    Shows a table one page at a time, formatting only the rows of the page.
+    Columns are sized from the first TABLE_WIDTH_SAMPLE rows and widen
+    when a page holds longer values.
+    """
+    _, col_widths = _format_cells(columns, data, 0, TABLE_WIDTH_SAMPLE)
+    page_count = -(-row_count // page_size)
+    page = 0
+    while True:
+        start = page * page_size
+        stop = min(start + page_size, row_count)
+        cells, col_widths = _format_cells(columns, data, start, stop, col_widths)
+        DisplayManager.write_block(_table_lines(columns, cells, col_widths, title))
+
+        command = input(
+            f"{GREY}Page {page + 1}/{page_count} (rows {start + 1}-{stop} of {row_count}). "
+            f"[n]ext, [p]revious, [j <page>] jump, [q]uit: {RESET}"
+        ).strip().lower()
+        if command in ("q", "back") or (command in ("", "n") and page == page_count - 1):
+            return
+        if command in ("", "n"):
+            page += 1
+        elif command == "p":
+            page = max(page - 1, 0)
+        elif command.startswith("j") and command[1:].strip().isdigit() and 1 <= int(command[1:]) <= page_count:
+            page = int(command[1:]) - 1
+        else:
+            print(f"{RED}Invalid command. Please try again.{RESET}")
 
 
 def sanitise_data(data, valid_values):
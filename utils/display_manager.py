@@ -1,5 +1,7 @@
 # ANSI color codes for styling
+import os
 import sys
+from utils.text_width import center
 
 BOLD = "\033[1m"
 UNDERLINE = "\033[4m"
@@ -16,41 +18,74 @@ ORANGE = "\033[1;33m"
 
 
 class DisplayManager:
+    # Menus and tables are written to the terminal in one go unless BREEZE_UNBUFFERED=1
+    # is set (or this is set to False), which is handy when debugging.
+    buffered = os.environ.get("BREEZE_UNBUFFERED", "") != "1"
+
     def __init__(self):
         self.breadcrumbs = []
         self.menu_stack = [] 
 
-    def show_breadcrumbs(self):
-        """Displays the navigation breadcrumbs."""
+    @classmethod
+    def write_block(cls, lines):
+        """
+        Writes the lines of a menu or table to the terminal with a single write,
+        rather than one write per line, and flushes them.
+        """
+        if cls.buffered:
+            sys.stdout.write("".join(line + "\n" for line in lines))
+        else:
+            for line in lines:
+                sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+    def format_breadcrumbs(self):
+        """Returns the navigation breadcrumbs."""
         if self.breadcrumbs:
             navigation = f"\nNavigation: {' > '.join(self.breadcrumbs)}"
-            print(f"\n{GREY}{navigation}{RESET}")
-        else:
-            print(f"\n{GREY}Navigation{RESET}")
+            return f"\n{GREY}{navigation}{RESET}"
+        return f"\n{GREY}Navigation{RESET}"
+
+    def format_centered_message(self, message, style):
+        """Returns a styled message centered in 70 columns."""
+        return f"{style}{center(message, 70)}{RESET}"
+
+    def format_divider(self, line, length, style):
+        """Returns a styled divider line."""
+        return f"{style}{line * length}{RESET}"
+
+    def format_text(self, style, text):
+        """Returns a text with styling."""
+        return f"{style}{text}{RESET}"
+
+    def show_breadcrumbs(self):
+        """Displays the navigation breadcrumbs."""
+        print(self.format_breadcrumbs())
 
     def print_centered_message(self, message, style):
         """Display centered message."""
-        centered_message = message.center(70)
-        print(f"{style}{centered_message}{RESET}")
+        print(self.format_centered_message(message, style))
 
     def print_divider(self, line, length, style):
         """Prints a styled divider line."""
-        print(f"{style}{line * length}{RESET}")
+        print(self.format_divider(line, length, style))
 
     def print_text(self, style, text):
         """Prints a text with styling."""
-        print(f"{style}{text}{RESET}")
+        print(self.format_text(style, text))
 
     def display_menu(self, title, options):
-            """Displays a menu (main or sub)."""
-            self.show_breadcrumbs()
-            self.print_divider(line="=", length=70, style=f"{BOLD}")
-            self.print_centered_message(message="🍃 Breeze Mental Health Management System 🍃", style=f"{GREEN}{BOLD}")
-            self.print_divider(line="=", length=70, style=f"{BOLD}")
-            self.print_text(text=f"{title}", style=f"{MAGENTA}{BOLD}")
-            self.print_text(text="Type 'back' at any time to return to the previous menu.", style=f"{GREY}")
-            for index, option in enumerate(options, start=1):
-                print(f"{ORANGE}[{index}] {RESET}{BOLD}{option}")
+            """Displays a menu (main or sub), composed and written as one block."""
+            lines = [
+                self.format_breadcrumbs(),
+                self.format_divider(line="=", length=70, style=f"{BOLD}"),
+                self.format_centered_message(message="🍃 Breeze Mental Health Management System 🍃", style=f"{GREEN}{BOLD}"),
+                self.format_divider(line="=", length=70, style=f"{BOLD}"),
+                self.format_text(text=f"{title}", style=f"{MAGENTA}{BOLD}"),
+                self.format_text(text="Type 'back' at any time to return to the previous menu.", style=f"{GREY}"),
+            ]
+            lines += [f"{ORANGE}[{index}] {RESET}{BOLD}{option}" for index, option in enumerate(options, start=1)]
+            self.write_block(lines)
             return input(f"{CYAN}Choose an option ⏳: {RESET}").strip().lower()
 
     def back_operation(self):
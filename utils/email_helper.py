@@ -1,4 +1,8 @@
-import smtplib
+import atexit
+import logging
+import os
+import threading
+import time
 
 port = 587
 smtp_server = "smtp.gmail.com"
@@ -10,7 +14,27 @@ sender_email = "breeze.app.user@gmail.com"
 # app specific password for google stmp under key python_email
 password = "cwog byoy wrqn xlhu"
 
+# Emails are queued in this SQLite database and delivered by a background thread
+OUTBOX_FILE = "data/email_outbox.db"
+# Delivery attempts before a message is given up on
+MAX_SEND_ATTEMPTS = 8
+# Delay before the first retry, doubled after each failed attempt up to MAX_RETRY_DELAY (seconds)
+RETRY_BASE_DELAY = 5
+MAX_RETRY_DELAY = 15 * 60
+# Timeout of each SMTP command (seconds)
+SMTP_TIMEOUT = 30
+# A message being sent is not picked up by another session for this long (seconds).
+# The lease is renewed just before each message is sent, and sending one message
+# takes a few SMTP commands, so it is several times SMTP_TIMEOUT.
+SEND_LEASE = 10 * SMTP_TIMEOUT
+# How long the app waits on exit for queued emails that are due to be delivered (seconds)
+DRAIN_TIMEOUT = 10
 
+logger = logging.getLogger(__name__)
+
+_worker = None
+_wake_up = None
+_stopping = False
 
 
 def send_email(recipient_email, subject, body):
@@ -21,15 +45,14 @@ def send_email(recipient_email, subject, body):
     body: string
     
     Functionality:
-        Sends and email from "breeze.app.user@gmail.com" to the recipient email
+        Queues an email from "breeze.app.user@gmail.com" to the recipient email
+        in the outbox and returns immediately. A background thread delivers it,
+        retrying with exponential backoff if the SMTP server cannot be reached,
+        and queued emails survive the app being closed.
 
     Returns:
-        bool: True if the email was sent successfully, False otherwise.
-
-    Raises:
-        smtplib.SMTPException: If an error occurs during the email sending process.
+        bool: True if the email was queued, False otherwise.
 
-    
     Example:
     recipient_email = "arkash707@gmail.com"
     subject = "Your Appointment has been confirmed"
@@ -40,16 +63,221 @@ def send_email(recipient_email, subject, body):
     send_email(recipient_email, subject, message_body)
 
     """
-
     try:
-        with smtplib.SMTP(smtp_server, port) as server:
-            server.starttls()
-            complete_email = f"Subject: {subject}\n\n{body}"
-            server.login(sender_email, password)
-            server.sendmail(sender_email, recipient_email, complete_email)
-            return True
+        connection = _outbox()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT INTO outbox (recipient, subject, body, created_at, next_attempt) VALUES (?, ?, ?, ?, ?)",
+                    (recipient_email, subject, body, time.time(), time.time())
+                )
+        finally:
+            connection.close()
     except Exception as error:
         print("Failed to send email")
         print(f"Error: ${error}")
         return False
+    start_outbox_worker()
+    return True
+
+
+def resume_outbox():
+    """
+    Starts delivering the emails left in the outbox by a previous session, if there are any.
+    """
+    if os.path.exists(OUTBOX_FILE):
+        start_outbox_worker()
+
+
+def start_outbox_worker():
+    """
+    Starts the background thread delivering the outbox, unless it is already running.
+    """
+    global _worker, _wake_up
+
+    if _worker is not None and _worker.is_alive():
+        _wake_up.set()
+        return
+    _wake_up = threading.Event()
+    if _worker is None:
+        atexit.register(_drain_outbox)
+    _worker = threading.Thread(target=_deliver_outbox, name="email-outbox", daemon=True)
+    _worker.start()
+
+
+def _outbox():
+    """
+    Opens a connection to the outbox database, creating the database if needed.
+    Each thread opens its own connection, which the caller closes.
+    """
+    # Imported on first use, like smtplib below
+    import sqlite3
+
+    directory = os.path.dirname(OUTBOX_FILE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(OUTBOX_FILE, timeout=30)
+    connection.execute(
+        """CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY,
+            recipient TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL,
+            last_error TEXT,
+            created_at REAL NOT NULL
+        )"""
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt)")
+    return connection
+
+
+def _claim_due_messages():
+    """
+    Returns the pending messages that are due, leasing them for SEND_LEASE
+    seconds so that other sessions leave them alone while they are sent.
+    """
+    connection = _outbox()
+    try:
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        messages = connection.execute(
+            "SELECT id, recipient, subject, body, attempts FROM outbox WHERE status = 'pending' AND next_attempt <= ? ORDER BY id",
+            (now,)
+        ).fetchall()
+        connection.executemany(
+            "UPDATE outbox SET attempts = attempts + 1, next_attempt = ? WHERE id = ?",
+            [(now + SEND_LEASE, message[0]) for message in messages]
+        )
+        connection.commit()
+        return messages
+    finally:
+        connection.close()
+
+
+def _next_due_in():
+    """
+    Returns the number of seconds until the next pending message is due, or None if there is none.
+    """
+    connection = _outbox()
+    try:
+        next_attempt = connection.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'").fetchone()[0]
+    finally:
+        connection.close()
+    return None if next_attempt is None else max(0, next_attempt - time.time())
+
+
+def _renew_lease(message_id, attempts):
+    """
+    Extends the lease of a claimed message by SEND_LEASE seconds before it is sent.
+    Returns False if the lease was lost, i.e. it ran out and another session
+    claimed the message (which increments attempts), in which case it must not be sent.
+    """
+    connection = _outbox()
+    try:
+        with connection:
+            renewed = connection.execute(
+                "UPDATE outbox SET next_attempt = ? WHERE id = ? AND attempts = ? AND status = 'pending'",
+                (time.time() + SEND_LEASE, message_id, attempts)
+            )
+        return renewed.rowcount == 1
+    finally:
+        connection.close()
+
+
+def _record_result(message_id, attempts, error=None):
+    """
+    Removes a message once it is sent, so that delivered emails are not kept
+    on disk, or schedules its next attempt after a failure. attempts is the
+    attempt count of our claim; a message since claimed by another session is left alone.
+    """
+    connection = _outbox()
+    try:
+        with connection:
+            if error is None:
+                connection.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+            elif attempts >= MAX_SEND_ATTEMPTS:
+                connection.execute(
+                    "UPDATE outbox SET status = 'failed', last_error = ? WHERE id = ? AND attempts = ?",
+                    (str(error), message_id, attempts)
+                )
+                logger.warning(f"Email {message_id} could not be delivered after {attempts} attempts: {error}")
+            else:
+                delay = min(MAX_RETRY_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+                connection.execute(
+                    "UPDATE outbox SET next_attempt = ?, last_error = ? WHERE id = ? AND attempts = ?",
+                    (time.time() + delay, str(error), message_id, attempts)
+                )
+    finally:
+        connection.close()
+
+
+def _send_messages(messages):
+    """
+    Delivers messages over one SMTP connection and records the result of each.
+    If the connection itself fails, every message is retried later.
+    """
+    # Imported on first use, so that starting the app does not load smtplib and ssl
+    import smtplib
+
+    try:
+        server = smtplib.SMTP(smtp_server, port, timeout=SMTP_TIMEOUT)
+    except Exception as error:
+        for message_id, _, _, _, attempts in messages:
+            _record_result(message_id, attempts + 1, error)
+        return
+    with server:
+        try:
+            server.starttls()
+            server.login(sender_email, password)
+        except Exception as error:
+            for message_id, _, _, _, attempts in messages:
+                _record_result(message_id, attempts + 1, error)
+            return
+        for message_id, recipient_email, subject, body, attempts in messages:
+            # Connecting and sending the earlier messages may have used up most of the lease
+            if not _renew_lease(message_id, attempts + 1):
+                continue
+            try:
+                complete_email = f"Subject: {subject}\n\n{body}"
+                server.sendmail(sender_email, recipient_email, complete_email)
+                _record_result(message_id, attempts + 1)
+            except Exception as error:
+                _record_result(message_id, attempts + 1, error)
 
+
+def _deliver_outbox():
+    """
+    Body of the background thread: sends the due messages, then sleeps until
+    the next one is due or a new one is queued. Stops once the outbox is
+    empty and the app is exiting.
+    """
+    while True:
+        try:
+            messages = _claim_due_messages()
+            if messages:
+                _send_messages(messages)
+                continue
+            wait = _next_due_in()
+        except Exception as error:
+            logger.warning(f"Email outbox error: {error}")
+            wait = RETRY_BASE_DELAY
+        if _stopping and (wait is None or wait > 0):
+            return
+        _wake_up.wait(timeout=wait)
+        _wake_up.clear()
+
+
+def _drain_outbox():
+    """
+    Gives the background thread up to DRAIN_TIMEOUT seconds on exit to deliver
+    the emails that are due. Anything left stays in the outbox for the next session.
+    """
+    global _stopping
+    if _worker is None or not _worker.is_alive():
+        return
+    _stopping = True
+    _wake_up.set()
+    _worker.join(timeout=DRAIN_TIMEOUT)
@@ -0,0 +1,170 @@
+import bisect
+
+
+class DataView:
+    """
+    Base class of the in-memory structures derived from one data file.
+
+    Views are created and kept up to date by utils.data_handler.get_view:
+    rebuild() receives every entry of the file, and the on_* hooks are called
+    after each add_entry / update_entry / delete_entry on that file, so a view
+    never has to rescan the file after our own writes. Positions are 0-based
+    positions of the entry in the file. Entries handed to a view are private
+    copies the view may keep.
+    """
+
+    def rebuild(self, entries):
+        raise NotImplementedError
+
+    def on_add(self, position, entry):
+        raise NotImplementedError
+
+    def on_update(self, position, old_entry, new_entry):
+        raise NotImplementedError
+
+    def on_delete(self, position, entry):
+        raise NotImplementedError
+
+
+class HashIndex(DataView):
+    """
+    Dict-of-lists index of the entries of a data file by the value of one key.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self._rows = []      # [position, entry] for every entry, in file order
+        self._buckets = {}   # value -> list of rows with that value
+
+    def rebuild(self, entries):
+        self._rows = []
+        self._buckets = {}
+        for position, entry in enumerate(entries):
+            self.on_add(position, entry)
+
+    def _bucket(self, entry):
+        value = entry.get(self.key)
+        try:
+            return self._buckets.setdefault(value, [])
+        except TypeError:
+            # Unhashable values (lists, dicts) are never looked up
+            return None
+
+    def on_add(self, position, entry):
+        row = [position, entry]
+        self._rows.append(row)
+        bucket = self._bucket(entry)
+        if bucket is not None:
+            bucket.append(row)
+
+    def on_update(self, position, old_entry, new_entry):
+        row = self._rows[position]
+        old_bucket = self._bucket(row[1])
+        row[1] = new_entry
+        new_bucket = self._bucket(new_entry)
+        if old_bucket is not new_bucket:
+            if old_bucket is not None:
+                old_bucket.remove(row)
+            if new_bucket is not None:
+                new_bucket.append(row)
+                new_bucket.sort(key=lambda r: r[0])
+
+    def on_delete(self, position, entry):
+        row = self._rows.pop(position)
+        bucket = self._bucket(row[1])
+        if bucket is not None:
+            bucket.remove(row)
+        # Entries after the deleted one move up by one position
+        for later_row in self._rows[position:]:
+            later_row[0] -= 1
+
+    def get(self, value):
+        """
+        Returns (position, entry) pairs for the entries whose key equals value, in file order.
+        """
+        try:
+            return [(row[0], row[1]) for row in self._buckets.get(value, ())]
+        except TypeError:
+            return []
+
+
+class SortedIndex(DataView):
+    """
+    Index of the entries of a data file by the value of one key, with the
+    entries of each value kept sorted by another field, e.g. the moods of
+    each patient_id ordered by timestamp. Entries are inserted and removed
+    with bisect, so keeping the index up to date never re-sorts a group.
+    """
+
+    def __init__(self, key, order_by):
+        self.key = key
+        self.order_by = order_by
+        self._rows = []      # [position, entry, sequence] for every entry, in file order
+        self._groups = {}    # value -> ([sort keys], [rows]), both in ascending sort key order
+        self._sequence = 0   # increases with every added entry, so it follows file order
+
+    def rebuild(self, entries):
+        self._rows = []
+        self._groups = {}
+        self._sequence = 0
+        for position, entry in enumerate(entries):
+            self.on_add(position, entry)
+
+    def _sort_key(self, row):
+        value = row[1].get(self.order_by)
+        # Missing values sort first; among equal values the later entry sorts
+        # first, so reading a group backwards gives latest first, ties in file order
+        return (value is not None, value, -row[2])
+
+    def _group(self, entry):
+        try:
+            return self._groups.setdefault(entry.get(self.key), ([], []))
+        except TypeError:
+            # Unhashable values (lists, dicts) are never looked up
+            return None
+
+    def _insert(self, row):
+        group = self._group(row[1])
+        if group is not None:
+            sort_key = self._sort_key(row)
+            i = bisect.bisect_right(group[0], sort_key)
+            group[0].insert(i, sort_key)
+            group[1].insert(i, row)
+
+    def _remove(self, row):
+        group = self._group(row[1])
+        if group is not None:
+            i = bisect.bisect_left(group[0], self._sort_key(row))
+            del group[0][i]
+            del group[1][i]
+
+    def on_add(self, position, entry):
+        row = [position, entry, self._sequence]
+        self._sequence += 1
+        self._rows.append(row)
+        self._insert(row)
+
+    def on_update(self, position, old_entry, new_entry):
+        row = self._rows[position]
+        self._remove(row)
+        row[1] = new_entry
+        self._insert(row)
+
+    def on_delete(self, position, entry):
+        row = self._rows.pop(position)
+        self._remove(row)
+        # Entries after the deleted one move up by one position
+        for later_row in self._rows[position:]:
+            later_row[0] -= 1
+
+    def latest(self, value, limit=None):
+        """
+        Returns (position, entry) pairs for the entries whose key equals value,
+        the greatest order_by value first, at most limit of them.
+        """
+        try:
+            rows = self._groups.get(value, ((), ()))[1]
+        except TypeError:
+            return []
+        count = len(rows) if limit is None else min(limit, len(rows))
+        return [(rows[-i][0], rows[-i][1]) for i in range(1, count + 1)]
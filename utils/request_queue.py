@@ -0,0 +1,129 @@
+import heapq
+from datetime import datetime
+from utils.data_handler import get_view
+from utils.indexes import DataView
+
+
+PENDING = "pending"
+
+
+def _epoch(requested_at):
+    """Returns the epoch seconds of a "YYYY-MM-DD HH:MM:SS" timestamp, or None if it is not valid."""
+    try:
+        return datetime.strptime(requested_at, "%Y-%m-%d %H:%M:%S").timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestQueue(DataView):
+    """
+    MHWP change requests of the request log, partitioned by status, with the
+    pending ones in a heap ordered by requested_at (oldest first) and every
+    request reachable by patient_id. Kept up to date by add_entry /
+    update_entry / delete_entry, so resolving a request updates it in place.
+
+    Rows are [position, entry, epoch, heap token]. The heap is cleaned lazily:
+    an item is only valid while its token is the one stored in its row.
+    """
+
+    def __init__(self):
+        self._rows = []          # every request, in file order
+        self._by_status = {}     # status -> {id(row): row}, in insertion order
+        self._by_patient = {}    # patient_id -> {id(row): row}
+        self._pending_heap = []  # (epoch, token, row) for the pending requests
+        self._next_token = 0
+        self._stale = 0          # heap items whose request is no longer pending
+
+    def rebuild(self, entries):
+        self.__init__()
+        for position, entry in enumerate(entries):
+            self.on_add(position, entry)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _insert(self, row):
+        entry = row[1]
+        self._by_status.setdefault(entry.get("status"), {})[id(row)] = row
+        self._by_patient.setdefault(entry.get("patient_id"), {})[id(row)] = row
+        if entry.get("status") == PENDING:
+            # Requests with an invalid timestamp go first, so they are not hidden
+            row[2] = _epoch(entry.get("requested_at")) or 0
+            row[3] = self._next_token
+            self._next_token += 1
+            heapq.heappush(self._pending_heap, (row[2], row[3], row))
+
+    def _remove(self, row):
+        entry = row[1]
+        del self._by_status[entry.get("status")][id(row)]
+        del self._by_patient[entry.get("patient_id")][id(row)]
+        if row[3] is not None:
+            row[3] = None
+            self._stale += 1
+            if self._stale > len(self._pending_heap) // 2:
+                self._compact()
+
+    def _compact(self):
+        self._pending_heap = [item for item in self._pending_heap if item[2][3] == item[1]]
+        heapq.heapify(self._pending_heap)
+        self._stale = 0
+
+    def on_add(self, position, entry):
+        row = [position, entry, None, None]
+        self._rows.append(row)
+        self._insert(row)
+
+    def on_update(self, position, old_entry, new_entry):
+        row = self._rows[position]
+        self._remove(row)
+        row[1] = new_entry
+        self._insert(row)
+
+    def on_delete(self, position, entry):
+        row = self._rows.pop(position)
+        self._remove(row)
+        # Requests after the deleted one move up by one position
+        for later_row in self._rows[position:]:
+            later_row[0] -= 1
+
+    def pending(self, limit=None):
+        """
+        Returns (position, request) pairs for the pending requests, oldest first,
+        at most limit of them. Positions are 0-based positions in the request log.
+        """
+        if limit is None:
+            limit = len(self._pending_heap)
+        valid = (item for item in self._pending_heap if item[2][3] == item[1])
+        return [(row[0], dict(row[1])) for _, _, row in heapq.nsmallest(limit, valid)]
+
+    def with_status(self, status):
+        """Returns (position, request) pairs for the requests with a status, in file order."""
+        rows = sorted(self._by_status.get(status, {}).values(), key=lambda row: row[0])
+        return [(row[0], dict(row[1])) for row in rows]
+
+    def for_patient(self, patient_id):
+        """Returns (position, request) pairs for the requests of a patient, in file order."""
+        rows = sorted(self._by_patient.get(patient_id, {}).values(), key=lambda row: row[0])
+        return [(row[0], dict(row[1])) for row in rows]
+
+    def all(self):
+        """Returns (position, request) pairs for every request, in file order."""
+        return [(row[0], dict(row[1])) for row in self._rows]
+
+    def counts(self):
+        """Returns {status: number of requests}."""
+        return {status: len(rows) for status, rows in self._by_status.items() if rows}
+
+    def request_at(self, position):
+        """Returns a copy of the request at a 0-based position, or None."""
+        if 0 <= position < len(self._rows):
+            return dict(self._rows[position][1])
+        return None
+
+
+def get_request_queue(request_log_file):
+    """
+    Returns the RequestQueue of a request log, rebuilt only when the file was
+    changed other than through the data handler functions.
+    """
+    return get_view(request_log_file, "queue", RequestQueue)
@@ -0,0 +1,258 @@
+import json
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from utils.storage_backend import StorageBackend
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Storage backend keeping every data file in one table of a SQLite database.
+
+    Each row stores the entry as JSON text plus copies of the foreign keys we
+    filter on, which are indexed. Rows are ordered by their integer primary key,
+    so 1-based entry indexes keep the meaning they have for the JSON files.
+    A table is filled from its JSON file the first time it is used.
+
+    Select it with the environment variable BREEZE_STORAGE=sqlite, or with
+    data_handler.set_backend(SQLiteBackend(...)).
+    """
+
+    INDEXED_KEYS = ("patient_id", "mhwp_id", "appointment_id")
+    filters_natively = True
+
+    def __init__(self, db_path="data/breeze.db"):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS imported_files (table_name TEXT PRIMARY KEY)")
+        self.connection.commit()
+        self._tables = set()
+        self._group_depth = 0
+        self._changes = {}   # table -> number of writes made through this connection
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Commits the statements run inside the block, unless a group commit is
+        open, in which case they stay in the group's transaction.
+        """
+        if self._group_depth > 0:
+            yield
+        else:
+            with self.connection:
+                yield
+
+    def begin_group(self):
+        self._group_depth += 1
+
+    def end_group(self, commit=True):
+        self._group_depth -= 1
+        if self._group_depth > 0:
+            return True
+        try:
+            if commit:
+                self.connection.commit()
+            else:
+                self.connection.rollback()
+                self._tables.clear()  # tables created inside the group may have been rolled back
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error while committing: {e}")
+            return False
+
+    def _table(self, filepath):
+        """
+        Returns the table name for a data file, creating and importing the table on first use.
+        """
+        name = re.sub(r"\W", "_", os.path.splitext(os.path.basename(filepath))[0])
+        if name in self._tables:
+            return name
+
+        with self._transaction():
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" ('
+                "id INTEGER PRIMARY KEY, "
+                + "".join(f"{key}, " for key in self.INDEXED_KEYS)
+                + "data TEXT NOT NULL)"
+            )
+            for key in self.INDEXED_KEYS:
+                self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{name}_{key}" ON "{name}" ({key})')
+
+            imported = self.connection.execute(
+                "SELECT 1 FROM imported_files WHERE table_name = ?", (name,)
+            ).fetchone()
+            if not imported:
+                self._import_json(name, filepath)
+                self.connection.execute("INSERT INTO imported_files VALUES (?)", (name,))
+
+        self._tables.add(name)
+        return name
+
+    def _import_json(self, table, filepath):
+        """
+        Copies the entries of an existing JSON data file into an empty table.
+        """
+        if not os.path.exists(filepath):
+            return
+        from utils.data_handler import JSONBackend
+        data = JSONBackend().read(filepath)
+        if isinstance(data, list):
+            self._insert(table, data)
+
+    def _row(self, entry):
+        """
+        Returns the column values stored for an entry.
+        """
+        keys = [entry.get(key) if isinstance(entry.get(key), (int, str)) else None for key in self.INDEXED_KEYS]
+        return (*keys, json.dumps(entry))
+
+    def _insert(self, table, entries):
+        columns = ", ".join(self.INDEXED_KEYS)
+        placeholders = ", ".join("?" for _ in range(len(self.INDEXED_KEYS) + 1))
+        self.connection.executemany(
+            f'INSERT INTO "{table}" ({columns}, data) VALUES ({placeholders})',
+            (self._row(entry) for entry in entries)
+        )
+
+    def _row_at(self, table, index):
+        """
+        Returns (id, entry) of the row at a 1-based position, or None.
+        """
+        if index < 1:
+            return None
+        row = self.connection.execute(
+            f'SELECT id, data FROM "{table}" ORDER BY id LIMIT 1 OFFSET ?', (index - 1,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def version(self, filepath):
+        """
+        Combines SQLite's data_version, which changes when another connection
+        commits, with the number of writes this connection made to the table.
+        """
+        try:
+            table = self._table(filepath)
+            data_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+            return (data_version, self._changes.get(table, 0))
+        except sqlite3.Error:
+            return None
+
+    def _changed(self, table):
+        self._changes[table] = self._changes.get(table, 0) + 1
+
+    def entry_at(self, filepath, index):
+        try:
+            row = self._row_at(self._table(filepath), index)
+            return row[1] if row else None
+        except sqlite3.Error:
+            return None
+
+    def read(self, filepath):
+        try:
+            table = self._table(filepath)
+            rows = self.connection.execute(f'SELECT data FROM "{table}" ORDER BY id')
+            return [json.loads(data) for (data,) in rows]
+        except sqlite3.Error as e:
+            print(f"Database error while reading {filepath}: {e}")
+            return None
+
+    def iter_entries(self, filepath, predicate=None):
+        try:
+            table = self._table(filepath)
+            for (data,) in self.connection.execute(f'SELECT data FROM "{table}" ORDER BY id'):
+                entry = json.loads(data)
+                if predicate is None or predicate(entry):
+                    yield entry
+        except sqlite3.Error as e:
+            print(f"Database error while reading {filepath}: {e}")
+
+    def save(self, filepath, data, expected_version=None):
+        try:
+            table = self._table(filepath)
+            with self._transaction():
+                if expected_version is not None:
+                    if not self.connection.in_transaction:
+                        # Take the write lock before comparing, so nobody can commit in between
+                        self.connection.execute("BEGIN IMMEDIATE")
+                    if self.version(filepath) != expected_version:
+                        print(f"{filepath} was changed by another session since it was read.")
+                        return False
+                self.connection.execute(f'DELETE FROM "{table}"')
+                self._insert(table, data)
+            self._changed(table)
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error while saving {filepath}: {e}")
+            return False
+
+    def add(self, filepath, entry):
+        try:
+            table = self._table(filepath)
+            with self._transaction():
+                self._insert(table, [entry])
+            self._changed(table)
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error while adding to {filepath}: {e}")
+            return False
+
+    def update(self, filepath, index, new_entry):
+        try:
+            table = self._table(filepath)
+            row = self._row_at(table, index)
+            if row is None:
+                print(f"Invalid index: {index}")
+                return False
+            row_id, entry = row
+            entry.update(new_entry)
+            assignments = ", ".join(f"{key} = ?" for key in self.INDEXED_KEYS)
+            with self._transaction():
+                self.connection.execute(
+                    f'UPDATE "{table}" SET {assignments}, data = ? WHERE id = ?', (*self._row(entry), row_id)
+                )
+            self._changed(table)
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error while updating {filepath}: {e}")
+            return False
+
+    def delete(self, filepath, index):
+        try:
+            table = self._table(filepath)
+            row = self._row_at(table, index)
+            if row is None:
+                print(f"Invalid index: {index}")
+                return False
+            with self._transaction():
+                self.connection.execute(f'DELETE FROM "{table}" WHERE id = ?', (row[0],))
+            self._changed(table)
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error while deleting from {filepath}: {e}")
+            return False
+
+    def query(self, filepath, criteria):
+        """
+        Filters in SQL: indexed keys use their column, other keys use json_extract.
+        """
+        try:
+            table = self._table(filepath)
+            conditions, params = [], []
+            for key, value in criteria.items():
+                if not re.fullmatch(r"\w+", key):
+                    raise ValueError(f"Invalid field name: {key}")
+                column = key if key in self.INDEXED_KEYS else f"json_extract(data, '$.{key}')"
+                if value is None:
+                    conditions.append(f"{column} IS NULL")
+                else:
+                    conditions.append(f"{column} = ?")
+                    params.append(value)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            rows = self.connection.execute(f'SELECT data FROM "{table}" {where} ORDER BY id', params)
+            return [json.loads(data) for (data,) in rows]
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Database error while querying {filepath}: {e}")
+            return None
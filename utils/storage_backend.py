@@ -0,0 +1,79 @@
+class StorageBackend:
+    """
+    Interface of the storage backends that sit behind utils.data_handler.
+
+    A collection is identified by the path of its JSON data file and holds a
+    list of flat dictionaries. Indexes passed to update and delete are 1-based
+    positions in that list, matching update_entry and delete_entry.
+    Errors are reported to the user and signalled with None / False, as the
+    data handler functions always have.
+    """
+
+    # True if query() filters natively instead of scanning the collection
+    filters_natively = False
+
+    def version(self, filepath):
+        """
+        Returns a value that changes whenever the collection changes, or None if unknown.
+        Derived views are rebuilt when it differs from the one they were built at.
+        """
+        return None
+
+    def entry_at(self, filepath, index):
+        """Returns a copy of the entry at a 1-based position, or None."""
+        data = self.read(filepath)
+        if isinstance(data, list) and 1 <= index <= len(data):
+            return data[index-1]
+        return None
+
+    def read(self, filepath):
+        """Returns every entry of the collection, or None if it cannot be read."""
+        raise NotImplementedError
+
+    def read_versioned(self, filepath):
+        """Returns (entries, version) read together, see save's expected_version."""
+        return self.read(filepath), self.version(filepath)
+
+    def iter_entries(self, filepath, predicate=None):
+        """Yields the entries of the collection for which predicate(entry) is true (all if None)."""
+        for entry in self.read(filepath) or []:
+            if predicate is None or predicate(entry):
+                yield entry
+
+    def save(self, filepath, data, expected_version=None):
+        """
+        Replaces the content of the collection. Returns True on success.
+        If expected_version is given and the collection's version differs from
+        it, another session changed it in the meantime: nothing is written.
+        """
+        raise NotImplementedError
+
+    def add(self, filepath, entry):
+        """Appends an entry to the collection. Returns True on success."""
+        raise NotImplementedError
+
+    def update(self, filepath, index, new_entry):
+        """Merges new_entry into the entry at the given position. Returns True on success."""
+        raise NotImplementedError
+
+    def delete(self, filepath, index):
+        """Deletes the entry at the given position. Returns True on success."""
+        raise NotImplementedError
+
+    def begin_group(self):
+        """Starts (or nests) a group commit: writes are held back until the outermost group ends."""
+        raise NotImplementedError
+
+    def end_group(self, commit=True):
+        """Ends a group commit, making its writes durable, or discarding them if commit is False."""
+        raise NotImplementedError
+
+    def query(self, filepath, criteria):
+        """
+        Returns the entries whose values equal every key value pair in criteria.
+        Backends that cannot filter natively fall back to scanning the collection.
+        """
+        data = self.read(filepath)
+        if data is None:
+            return None
+        return [entry for entry in data if all(entry.get(key) == value for key, value in criteria.items())]
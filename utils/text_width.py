@@ -0,0 +1,91 @@
+"""
+Terminal display width of strings, used to align tables and centered
+messages that contain ANSI color codes, emojis or East Asian characters.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+
+# Matches the ANSI escape sequences used for colours and styles
+ANSI_ESCAPE = re.compile(r'\033\[[0-9;]*m')
+
+ZERO_WIDTH_JOINER = "\u200d"
+# Asks for the emoji presentation of the previous character, which is two columns wide
+VARIATION_SELECTOR_16 = "\ufe0f"
+SKIN_TONE_MODIFIERS = range(0x1F3FB, 0x1F400)
+
+
+def strip_ansi(text):
+    """Returns text without its ANSI escape sequences."""
+    return ANSI_ESCAPE.sub('', text) if "\033" in text else text
+
+
+@lru_cache(maxsize=4096)
+def char_width(char):
+    """
+    Returns the number of terminal columns a single character takes:
+    0 for combining marks and control or format characters, 2 for wide
+    and fullwidth characters (East Asian ideographs, most emojis), else 1.
+    """
+    if unicodedata.combining(char) or unicodedata.category(char) in ("Mn", "Me", "Cf", "Cc"):
+        return 0
+    if unicodedata.east_asian_width(char) in ("W", "F"):
+        return 2
+    return 1
+
+
+def display_width(text):
+    """
+    Returns the number of terminal columns text takes once printed.
+    ANSI escape sequences take none, and an emoji sequence (emoji with a
+    variation selector, skin tone or zero width joiners) counts as one emoji.
+    """
+    if text.isascii() and text.isprintable():
+        # Plain text, the common case: no need to look at each character
+        return len(text)
+    return _complex_width(text)
+
+
+@lru_cache(maxsize=8192)
+def _complex_width(text):
+    text = strip_ansi(text)
+    if text.isascii() and text.isprintable():
+        return len(text)
+
+    width = 0
+    previous_width = 0
+    after_joiner = False
+    for char in text:
+        if char == ZERO_WIDTH_JOINER:
+            after_joiner = True
+            continue
+        if char == VARIATION_SELECTOR_16:
+            if previous_width == 1:
+                width += 1
+                previous_width = 2
+            continue
+        if after_joiner:
+            # Joined to the previous emoji, e.g. the members of a family emoji
+            after_joiner = False
+            continue
+        if ord(char) in SKIN_TONE_MODIFIERS and previous_width == 2:
+            continue
+        char_columns = char_width(char)
+        if char_columns:
+            width += char_columns
+            previous_width = char_columns
+    return width
+
+
+def center(text, width):
+    """
+    Centers text in a field of width columns, like str.center but measuring
+    text by its display width (so the padding matches what str.center gives
+    for plain ASCII).
+    """
+    margin = width - display_width(text)
+    if margin <= 0:
+        return text
+    left = margin // 2 + (margin & width & 1)
+    return " " * left + text + " " * (margin - left)